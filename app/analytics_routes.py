@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.db import read_db
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Buckets are aligned to local time, so "day" means a Taipei calendar day
+ANALYTICS_TIMEZONE = "Asia/Taipei"
+
+BUCKET_SIZES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Window used when no start is given
+DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=6),
+    "hour": timedelta(days=7),
+    "day": timedelta(days=90),
+}
+
+MAX_BUCKETS = 5000
+
+# Count check-ins per event per bucket inside [start, end), zero-filling
+# empty buckets so each series is a continuous curve. The range filter is
+# served by the (eventName, checkInAt) / (checkInAt) indexes on EventLog.
+CHECKINS_BY_BUCKET_SQL = '''
+WITH bounds AS (
+    SELECT
+        ($3::timestamptz AT TIME ZONE 'UTC') AS "start",
+        ($4::timestamptz AT TIME ZONE 'UTC') AS "end"
+),
+counts AS (
+    SELECT
+        "eventName",
+        date_trunc($1, ("checkInAt" AT TIME ZONE 'UTC') AT TIME ZONE $5) AS "bucket",
+        COUNT(*) AS "count"
+    FROM "EventLog", bounds
+    WHERE "checkInAt" >= bounds."start"
+      AND "checkInAt" < bounds."end"
+      AND ($2::text IS NULL OR "eventName" = $2)
+    GROUP BY 1, 2
+),
+buckets AS (
+    SELECT generate_series(
+        date_trunc($1, ($3::timestamptz) AT TIME ZONE $5),
+        date_trunc($1, ($4::timestamptz - interval '1 microsecond') AT TIME ZONE $5),
+        ('1 ' || $1)::interval
+    ) AS "bucket"
+),
+events AS (
+    SELECT DISTINCT "eventName" FROM counts
+)
+SELECT
+    events."eventName" AS "event_name",
+    to_char(buckets."bucket", 'YYYY-MM-DD"T"HH24:MI:SS') AS "bucket",
+    COALESCE(counts."count", 0) AS "count"
+FROM events
+CROSS JOIN buckets
+LEFT JOIN counts
+    ON counts."eventName" = events."eventName" AND counts."bucket" = buckets."bucket"
+ORDER BY events."eventName", buckets."bucket"
+'''
+
+
+@router.get("/checkins")
+async def get_checkin_throughput(
+    bucket: Literal["minute", "hour", "day"] = Query(default="hour", description="時間區間大小"),
+    event: str | None = Query(default=None, description="只看特定活動（預設全部）"),
+    start: datetime | None = Query(default=None, description="起始時間（含）"),
+    end: datetime | None = Query(default=None, description="結束時間（不含，預設現在）")
+):
+    """
+    Check-ins per event per time bucket, aggregated in the database.
+
+    Buckets are labelled with their local (Asia/Taipei) start time and
+    empty buckets are returned as zero.
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - DEFAULT_WINDOWS[bucket]
+    # Naive timestamps are taken as UTC, like the rest of the API
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / BUCKET_SIZES[bucket] > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for {bucket} buckets (max {MAX_BUCKETS})"
+        )
+
+    rows = await read_db.query_raw(
+        CHECKINS_BY_BUCKET_SQL,
+        bucket,
+        event,
+        start.isoformat(),
+        end.isoformat(),
+        ANALYTICS_TIMEZONE
+    )
+
+    series: dict[str, list[dict]] = {}
+    for row in rows:
+        series.setdefault(row["event_name"], []).append({
+            "bucket": row["bucket"],
+            "count": int(row["count"])
+        })
+
+    return {
+        "bucket": bucket,
+        "timezone": ANALYTICS_TIMEZONE,
+        "start": start,
+        "end": end,
+        "series": [
+            {
+                "event_name": event_name,
+                "total": sum(point["count"] for point in points),
+                "points": points
+            }
+            for event_name, points in series.items()
+        ]
+    }
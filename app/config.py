@@ -0,0 +1,12 @@
+import os
+from datetime import datetime, timezone
+
+
+def get_event_name() -> str:
+    """Get current event name from environment variable."""
+    return os.getenv("EVENT_NAME", "2026春季招生活動")
+
+
+def utcnow() -> datetime:
+    """Current UTC time, aware; Prisma stores it as naive UTC."""
+    return datetime.now(timezone.utc)
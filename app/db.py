@@ -1,13 +1,74 @@
+import os
+from datetime import timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
 from prisma import Prisma
 
-db = Prisma()
+from app.metrics import instrument_prisma
+
+instrument_prisma()
+
+
+def with_pool_settings(url: str, pool_size: str | None, pool_timeout: str | None) -> str:
+    """Set the query engine's connection_limit / pool_timeout on a database URL."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    if pool_size:
+        query["connection_limit"] = pool_size
+    if pool_timeout:
+        query["pool_timeout"] = pool_timeout
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def create_client(url: str | None, pool_size: str | None) -> Prisma:
+    """
+    Create a Prisma client with the pool and timeout settings from env.
+
+    Each client runs its own query engine with its own connection pool.
+    """
+    kwargs = {
+        "connect_timeout": timedelta(seconds=float(os.getenv("DB_CONNECT_TIMEOUT", "10")))
+    }
+    query_timeout = os.getenv("DB_QUERY_TIMEOUT")
+    if query_timeout:
+        kwargs["http"] = {"timeout": float(query_timeout)}
+    if url:
+        kwargs["datasource"] = {
+            "url": with_pool_settings(url, pool_size, os.getenv("DB_POOL_TIMEOUT"))
+        }
+    return Prisma(**kwargs)
+
+
+# Primary: all writes, and reads that must see them immediately
+db = create_client(os.getenv("DATABASE_URL"), os.getenv("DB_POOL_SIZE"))
+
+# Heavy read-only routes (user lists, exports, previews, analytics) use
+# read_db. It is a separate client, with its own pool, when a replica URL or
+# a dedicated read pool size is configured, so those reads cannot take the
+# connections kiosk check-ins need; otherwise it is the primary client.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+READ_POOL_SIZE = os.getenv("DB_READ_POOL_SIZE")
+
+if DATABASE_READ_URL or READ_POOL_SIZE:
+    read_db = create_client(DATABASE_READ_URL or os.getenv("DATABASE_URL"), READ_POOL_SIZE)
+else:
+    read_db = db
+
+# Replicas can lag, so "changed since" reads leave some overlap
+READ_LAG_ALLOWANCE = timedelta(
+    seconds=float(os.getenv("DB_REPLICA_LAG_SECONDS", "5")) if DATABASE_READ_URL else 0
+)
 
 
 async def connect_db():
     """Connect to the database."""
     await db.connect()
+    if read_db is not db:
+        await read_db.connect()
 
 
 async def disconnect_db():
     """Disconnect from the database."""
+    if read_db is not db and read_db.is_connected():
+        await read_db.disconnect()
     await db.disconnect()
@@ -1,7 +1,12 @@
 """
 預設郵件範本
-使用 {{name}} 作為收件人姓名佔位符
+可用佔位符：{{name}}、{{email}}、{{phone}}、{{tags}}、{{event_name}}、{{unsubscribe_url}}
 """
+import re
+from functools import lru_cache
+from html import escape
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
 
 TEMPLATES = {
     "welcome": {
@@ -82,6 +87,7 @@ TEMPLATES = {
     </div>
     <div class="footer">
         <p>此郵件由系統自動發送，請勿直接回覆。</p>
+        <p>如不想再收到此類通知，請點擊 <a href="{{unsubscribe_url}}">取消訂閱</a></p>
     </div>
 </body>
 </html>
@@ -125,6 +131,7 @@ TEMPLATES = {
     </div>
     <div class="footer">
         <p>此郵件由系統自動發送，請勿直接回覆。</p>
+        <p>如不想再收到此類通知，請點擊 <a href="{{unsubscribe_url}}">取消訂閱</a></p>
     </div>
 </body>
 </html>
@@ -169,6 +176,7 @@ TEMPLATES = {
     </div>
     <div class="footer">
         <p>此郵件由系統自動發送，請勿直接回覆。</p>
+        <p>如不想再收到此類通知，請點擊 <a href="{{unsubscribe_url}}">取消訂閱</a></p>
     </div>
 </body>
 </html>
@@ -202,6 +210,7 @@ TEMPLATES = {
     </div>
     <div class="footer">
         <p>此郵件由系統自動發送，請勿直接回覆。</p>
+        <p>如不想再收到此類通知，請點擊 <a href="{{unsubscribe_url}}">取消訂閱</a></p>
     </div>
 </body>
 </html>
@@ -221,3 +230,54 @@ def get_all_templates() -> list[dict]:
         {"id": tid, "name": t["name"], "subject": t["subject"]}
         for tid, t in TEMPLATES.items()
     ]
+
+
+class CompiledTemplate:
+    """
+    A template pre-split into static segments and placeholder slots.
+
+    Rendering is a single join over the segments, so a campaign parses its
+    HTML once instead of running str.replace per placeholder per recipient.
+    """
+
+    __slots__ = ("segments", "slots")
+
+    def __init__(self, source: str):
+        self.segments: list[str] = []
+        self.slots: list[tuple[str, str]] = []  # (placeholder name, original text)
+
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            self.segments.append(source[position:match.start()])
+            self.slots.append((match.group(1), match.group(0)))
+            position = match.end()
+        self.segments.append(source[position:])
+
+    def render(self, values: dict[str, str]) -> str:
+        """Fill the slots; unknown placeholders are left untouched."""
+        if not self.slots:
+            return self.segments[0]
+
+        parts = [self.segments[0]]
+        for (name, original), segment in zip(self.slots, self.segments[1:]):
+            parts.append(values.get(name, original))
+            parts.append(segment)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=64)
+def compile_template(source: str) -> CompiledTemplate:
+    """Compile (and cache) a template source string."""
+    return CompiledTemplate(source)
+
+
+def get_placeholder_values(user, event_name: str = "", unsubscribe_url: str = "#") -> dict[str, str]:
+    """Build HTML-escaped placeholder values for a recipient."""
+    return {
+        "name": escape(user.name or "朋友"),
+        "email": escape(user.email),
+        "phone": escape(user.phone or ""),
+        "tags": escape(", ".join(user.tags)),
+        "event_name": escape(event_name),
+        "unsubscribe_url": escape(unsubscribe_url),
+    }
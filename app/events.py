@@ -0,0 +1,83 @@
+import json
+import asyncio
+
+from fastapi import APIRouter, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+router = APIRouter()
+
+# Seconds between keep-alive comments on idle SSE connections
+HEARTBEAT_SECONDS = 15
+
+
+class EventHub:
+    """
+    In-process pub/sub hub for live page updates.
+
+    Each subscriber gets a bounded queue; a subscriber that falls too far
+    behind is dropped rather than slowing down publishers.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self.subscribers: set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event_type: str, data: dict):
+        """Broadcast an event to all subscribers without blocking."""
+        if not self.subscribers:
+            return
+
+        message = f"event: {event_type}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: end its stream; the browser reconnects
+                # and resyncs with a delta fetch
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+hub = EventHub()
+
+
+async def stream_events(request: Request, queue: asyncio.Queue):
+    """Yield queued events as SSE frames until the client disconnects."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+
+            if message is None:
+                return
+            yield message
+    finally:
+        hub.unsubscribe(queue)
+
+
+@router.get("/events")
+async def subscribe_events(request: Request):
+    """Server-sent events stream of check-ins and campaign progress."""
+    queue = hub.subscribe()
+    return StreamingResponse(
+        stream_events(request, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
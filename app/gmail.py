@@ -1,17 +1,64 @@
 import os
+import time
+import uuid
+import asyncio
 import base64
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
-
-def get_gmail_service():
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from email.header import Header
+from html import escape
+from typing import TYPE_CHECKING
+
+from app.config import utcnow
+from app.email_templates import compile_template
+from app.metrics import email_send_duration, email_send_total
+from app.rate_limit import (
+    EmailDeferred,
+    EmailQuotaError,
+    get_rate_limiter,
+    get_quota_max_retries,
+    reserve_daily_send,
+    refund_daily_send,
+    next_quota_reset,
+    throttle_backoff,
+)
+
+# The Google client stack is slow to import, so it is loaded on first use
+# rather than at application startup
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.errors import HttpError
+
+# Gmail error reasons that mean "slow down" rather than "this send is bad"
+QUOTA_ERROR_REASONS = (
+    "ratelimitexceeded",
+    "userratelimitexceeded",
+    "quotaexceeded",
+    "dailylimitexceeded",
+    "sending quota",
+    "sending limit",
+)
+
+# Process-wide OAuth credentials; the access token is kept until it expires
+_credentials: "Credentials | None" = None
+_credentials_lock = threading.Lock()
+
+# httplib2 is not thread-safe, so each thread gets its own service instance
+_local = threading.local()
+
+
+def get_gmail_credentials() -> "Credentials | None":
     """
-    Get Gmail API service instance.
+    Get the shared Gmail OAuth credentials.
     Returns None if credentials are not configured.
     """
+    global _credentials
+
+    if _credentials is not None:
+        return _credentials
+
     client_id = os.getenv("GMAIL_CLIENT_ID")
     client_secret = os.getenv("GMAIL_CLIENT_SECRET")
     refresh_token = os.getenv("GMAIL_REFRESH_TOKEN")
@@ -20,35 +67,317 @@ def get_gmail_service():
         print("Gmail credentials not configured")
         return None
 
-    credentials = Credentials(
-        token=None,
-        refresh_token=refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=client_id,
-        client_secret=client_secret,
+    from google.oauth2.credentials import Credentials
+
+    with _credentials_lock:
+        if _credentials is None:
+            _credentials = Credentials(
+                token=None,
+                refresh_token=refresh_token,
+                token_uri="https://oauth2.googleapis.com/token",
+                client_id=client_id,
+                client_secret=client_secret,
+            )
+    return _credentials
+
+
+def get_gmail_service():
+    """
+    Get Gmail API service instance.
+    Returns None if credentials are not configured.
+
+    The service is built once per thread from the discovery document
+    bundled with googleapiclient, and shares the process-wide credentials,
+    which refresh the access token only when it has expired.
+    """
+    service = getattr(_local, "service", None)
+    if service is not None:
+        return service
+
+    credentials = get_gmail_credentials()
+    if credentials is None:
+        return None
+
+    from googleapiclient.discovery import build
+
+    service = build(
+        "gmail",
+        "v1",
+        credentials=credentials,
+        static_discovery=True,
+        cache_discovery=False
     )
+    _local.service = service
+    return service
+
+
+def warm_up_gmail() -> bool:
+    """
+    Build the Gmail service and fetch an access token ahead of the first send.
+
+    Blocking; run it on the send executor once the application is serving.
+    The service it builds belongs to the pool thread that runs it, while the
+    client imports and the access token are shared by every send thread.
+    """
+    try:
+        service = get_gmail_service()
+        if service is None:
+            return False
+
+        from google.auth.transport.requests import Request
+
+        with _credentials_lock:
+            if not _credentials.valid:
+                _credentials.refresh(Request())
+        print("Gmail client warmed up")
+        return True
+
+    except Exception as e:
+        print(f"Failed to warm up Gmail client: {e}")
+        return False
+
+
+class MessageScaffold:
+    """
+    Pre-encoded MIME headers and part boundaries for one sender and subject.
+
+    Equivalent to a multipart/alternative MIMEMultipart with a plain-text
+    fallback and an HTML part, but only the recipient-specific pieces are
+    encoded per message.
+    """
+
+    def __init__(self, sender: str, subject: str):
+        boundary = f"==============={uuid.uuid4().hex}=="
+        encoded_subject = Header(subject, "utf-8").encode()
+        part_headers = (
+            'Content-Type: text/{subtype}; charset="utf-8"\n'
+            "MIME-Version: 1.0\n"
+            "Content-Transfer-Encoding: base64\n\n"
+        )
+
+        self.head = (
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\n'
+            "MIME-Version: 1.0\n"
+            f"From: {sender}\n"
+            f"Subject: {encoded_subject}\n\n"
+        ).encode("utf-8")
+        self.text_head = (f"--{boundary}\n" + part_headers.format(subtype="plain")).encode("utf-8")
+        self.html_head = (f"--{boundary}\n" + part_headers.format(subtype="html")).encode("utf-8")
+        self.tail = f"--{boundary}--\n".encode("utf-8")
+
+    def build(
+        self,
+        to_email: str,
+        html_content: str,
+        name: str | None = None,
+        unsubscribe_url: str | None = None
+    ) -> bytes:
+        """Assemble the full RFC 822 message for one recipient."""
+        unsubscribe_headers = (
+            f"List-Unsubscribe: <{unsubscribe_url}>\n"
+            "List-Unsubscribe-Post: List-Unsubscribe=One-Click\n"
+        ).encode("utf-8") if unsubscribe_url else b""
+        return b"".join([
+            f"To: {to_email}\n".encode("utf-8"),
+            unsubscribe_headers,
+            self.head,
+            self.text_head,
+            encode_text_fallback(name),
+            self.html_head,
+            base64.encodebytes(html_content.encode("utf-8")),
+            self.tail,
+        ])
+
+
+@lru_cache(maxsize=128)
+def get_message_scaffold(sender: str, subject: str) -> MessageScaffold:
+    """Get the cached MIME scaffold for a sender and subject."""
+    return MessageScaffold(sender, subject)
+
+
+@lru_cache(maxsize=4096)
+def encode_text_fallback(name: str | None) -> bytes:
+    """Base64-encode the plain text fallback part for a recipient name."""
+    greeting = f"親愛的 {name}" if name else "親愛的朋友"
+    text = f"{greeting}，您好！\n\n此郵件包含 HTML 內容，請使用支援 HTML 的郵件客戶端查看。"
+    return base64.encodebytes(text.encode("utf-8"))
+
+
+def get_send_concurrency() -> int:
+    """Get the number of concurrent Gmail sends from environment variable."""
+    return max(1, int(os.getenv("EMAIL_SEND_CONCURRENCY", "8")))
 
-    return build("gmail", "v1", credentials=credentials)
+
+_send_executor: ThreadPoolExecutor | None = None
+
+
+def get_send_executor() -> ThreadPoolExecutor:
+    """Get the bounded thread pool that runs blocking Gmail API calls."""
+    global _send_executor
+    if _send_executor is None:
+        _send_executor = ThreadPoolExecutor(
+            max_workers=get_send_concurrency(),
+            thread_name_prefix="gmail-send"
+        )
+    return _send_executor
+
+
+def shutdown_send_executor():
+    """Wait for in-flight sends and stop the Gmail thread pool."""
+    global _send_executor
+    if _send_executor is not None:
+        _send_executor.shutdown(wait=True)
+        _send_executor = None
 
 
 async def send_email(
     to_email: str,
     subject: str,
     html_content: str,
-    name: str | None = None
+    name: str | None = None,
+    unsubscribe_url: str | None = None
+) -> bool:
+    """
+    Send an email using Gmail API without blocking the event loop.
+
+    The blocking API call runs on the shared send thread pool, so at most
+    EMAIL_SEND_CONCURRENCY sends are in flight across the process. Sends
+    are paced by the adaptive rate limiter; a send rejected for quota is
+    retried after a backoff. Each email takes one unit of the daily budget
+    however many attempts it needs, and gives it back if it is never
+    handed to the transport successfully.
+
+    Returns:
+        True if email sent successfully, False otherwise
+
+    Raises:
+        EmailDeferred: the quota will not allow this send for now; the
+            caller should retry the recipient at `retry_at`
+    """
+    loop = asyncio.get_running_loop()
+    limiter = get_rate_limiter()
+    max_retries = get_quota_max_retries()
+
+    reservation = await reserve_daily_send()
+    attempted = False
+    try:
+        for attempt in range(max_retries + 1):
+            await limiter.acquire()
+            try:
+                success = await loop.run_in_executor(
+                    get_send_executor(),
+                    partial(send_email_sync, to_email, subject, html_content, name, unsubscribe_url)
+                )
+            except EmailQuotaError as e:
+                if e.daily:
+                    raise EmailDeferred(next_quota_reset(), str(e))
+                backoff = e.retry_after or throttle_backoff(attempt)
+                limiter.throttled(backoff)
+                continue
+
+            attempted = True
+            if success:
+                limiter.succeeded()
+            return success
+
+        raise EmailDeferred(
+            utcnow() + timedelta(seconds=throttle_backoff(max_retries)),
+            "Sending rate limit exceeded"
+        )
+    finally:
+        # Deferred or errored before the transport took the message
+        if not attempted:
+            await refund_daily_send(reservation)
+
+
+def get_email_transport() -> str:
+    """Get the email transport: "gmail" (default) or "stub" for benchmarks."""
+    return os.getenv("EMAIL_TRANSPORT", "gmail").lower()
+
+
+def send_email_stub(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    name: str | None = None,
+    unsubscribe_url: str | None = None
+) -> bool:
+    """
+    Build the message like a real send, then sleep for EMAIL_STUB_LATENCY_MS
+    instead of calling the Gmail API. Used by the benchmark harness.
+    """
+    sender = os.getenv("GMAIL_USER", "stub@example.com")
+    get_message_scaffold(sender, subject).build(to_email, html_content, name, unsubscribe_url)
+    time.sleep(float(os.getenv("EMAIL_STUB_LATENCY_MS", "50")) / 1000)
+    return True
+
+
+def send_email_sync(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    name: str | None = None,
+    unsubscribe_url: str | None = None
 ) -> bool:
     """
-    Send an email using Gmail API.
+    Send an email through the configured transport (blocking).
 
     Args:
         to_email: Recipient email address
         subject: Email subject
         html_content: HTML content of the email
         name: Optional recipient name for plain text fallback
+        unsubscribe_url: Optional List-Unsubscribe link for bulk mail
 
     Returns:
         True if email sent successfully, False otherwise
     """
+    transport = get_email_transport()
+    start = time.perf_counter()
+
+    try:
+        if transport == "stub":
+            success = send_email_stub(to_email, subject, html_content, name, unsubscribe_url)
+        else:
+            success = send_email_gmail(to_email, subject, html_content, name, unsubscribe_url)
+    except EmailQuotaError:
+        email_send_total.inc((transport, "throttled"))
+        raise
+
+    email_send_duration.observe(time.perf_counter() - start, (transport,))
+    email_send_total.inc((transport, "sent" if success else "failed"))
+    return success
+
+
+def parse_quota_error(error: "HttpError") -> EmailQuotaError | None:
+    """Turn a Gmail rate-limit or quota rejection into an EmailQuotaError."""
+    status = getattr(error.resp, "status", None)
+    detail = str(error).lower()
+    if status not in (429, 403):
+        return None
+    if status == 403 and not any(reason in detail for reason in QUOTA_ERROR_REASONS):
+        return None
+
+    retry_after = None
+    try:
+        retry_after = float(error.resp.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+
+    daily = "daily" in detail or "sending limit" in detail or "sending quota" in detail
+    return EmailQuotaError(str(error), retry_after=retry_after, daily=daily)
+
+
+def send_email_gmail(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    name: str | None = None,
+    unsubscribe_url: str | None = None
+) -> bool:
+    """Send an email using Gmail API (blocking)."""
+    from googleapiclient.errors import HttpError
+
     try:
         gmail_user = os.getenv("GMAIL_USER")
         service = get_gmail_service()
@@ -57,25 +386,9 @@ async def send_email(
             print("Gmail not configured, skipping email")
             return False
 
-        greeting = f"親愛的 {name}" if name else "親愛的朋友"
-
-        message = MIMEMultipart("alternative")
-        message["to"] = to_email
-        message["from"] = gmail_user
-        message["subject"] = subject
-
-        # Plain text fallback
-        text_part = MIMEText(
-            f"{greeting}，您好！\n\n此郵件包含 HTML 內容，請使用支援 HTML 的郵件客戶端查看。",
-            "plain",
-            "utf-8"
-        )
-        html_part = MIMEText(html_content, "html", "utf-8")
-
-        message.attach(text_part)
-        message.attach(html_part)
-
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
+        raw_message = base64.urlsafe_b64encode(
+            get_message_scaffold(gmail_user, subject).build(to_email, html_content, name, unsubscribe_url)
+        ).decode("utf-8")
 
         service.users().messages().send(
             userId="me",
@@ -85,42 +398,46 @@ async def send_email(
         print(f"Email sent successfully to {to_email}")
         return True
 
-    except Exception as e:
+    except HttpError as e:
+        quota_error = parse_quota_error(e)
+        if quota_error:
+            print(f"Gmail quota hit sending to {to_email}: {e}")
+            raise quota_error
         print(f"Failed to send email to {to_email}: {e}")
         return False
 
+    except Exception as e:
+        print(f"Failed to send email to {to_email}: {e}")
+        return False
 
-def get_welcome_email_template(name: str | None = None) -> str:
-    """Generate welcome email HTML template."""
-    greeting = f"親愛的 {name}" if name else "親愛的朋友"
 
-    return f"""
+WELCOME_EMAIL_TEMPLATE = compile_template("""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
         <style>
-            body {{
+            body {
                 font-family: 'Microsoft JhengHei', Arial, sans-serif;
                 line-height: 1.8;
                 color: #333;
                 max-width: 600px;
                 margin: 0 auto;
                 padding: 20px;
-            }}
-            .header {{
+            }
+            .header {
                 background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                 color: white;
                 padding: 30px;
                 text-align: center;
                 border-radius: 10px 10px 0 0;
-            }}
-            .content {{
+            }
+            .content {
                 background: #f9f9f9;
                 padding: 30px;
                 border-radius: 0 0 10px 10px;
-            }}
-            .button {{
+            }
+            .button {
                 display: inline-block;
                 background: #667eea;
                 color: white;
@@ -128,13 +445,13 @@ def get_welcome_email_template(name: str | None = None) -> str:
                 text-decoration: none;
                 border-radius: 5px;
                 margin-top: 20px;
-            }}
-            .footer {{
+            }
+            .footer {
                 text-align: center;
                 margin-top: 20px;
                 color: #666;
                 font-size: 12px;
-            }}
+            }
         </style>
     </head>
     <body>
@@ -143,7 +460,7 @@ def get_welcome_email_template(name: str | None = None) -> str:
             <h2>國際與文化組</h2>
         </div>
         <div class="content">
-            <p>{greeting}，您好！</p>
+            <p>{{greeting}}，您好！</p>
 
             <p>感謝您對華語文教學系國際與文化組的關注與支持！</p>
 
@@ -167,7 +484,13 @@ def get_welcome_email_template(name: str | None = None) -> str:
         </div>
     </body>
     </html>
-    """
+    """)
+
+
+def get_welcome_email_template(name: str | None = None) -> str:
+    """Generate welcome email HTML template."""
+    greeting = f"親愛的 {escape(name)}" if name else "親愛的朋友"
+    return WELCOME_EMAIL_TEMPLATE.render({"greeting": greeting})
 
 
 async def send_welcome_email(to_email: str, name: str | None = None) -> bool:
@@ -190,7 +513,11 @@ async def send_welcome_email(to_email: str, name: str | None = None) -> bool:
     )
 
 
-def get_admission_notice_template(name: str | None = None, deadline: str = "") -> str:
+def get_admission_notice_template(
+    name: str | None = None,
+    deadline: str = "",
+    unsubscribe_url: str = "#"
+) -> str:
     """Generate admission notice email HTML template."""
     greeting = f"親愛的 {name}" if name else "親愛的朋友"
 
@@ -271,7 +598,7 @@ def get_admission_notice_template(name: str | None = None, deadline: str = "") -
         </div>
         <div class="footer">
             <p>此郵件由系統自動發送，請勿直接回覆。</p>
-            <p>如不想再收到此類通知，請點擊 <a href="#">取消訂閱</a></p>
+            <p>如不想再收到此類通知，請點擊 <a href="{escape(unsubscribe_url)}">取消訂閱</a></p>
         </div>
     </body>
     </html>
@@ -0,0 +1,232 @@
+import os
+import io
+import csv
+import json
+import re
+
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from pydantic import ValidationError
+
+from app.db import db
+from app.schemas import CheckInRequest, format_validation_error
+from app.user_cache import user_cache
+from app.suppression import normalize_email
+from app.response_cache import USERS, bump
+from app.events import hub
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+# Column aliases, so files exported from /api/export/csv can be re-imported
+COLUMN_ALIASES = {
+    "email": "email",
+    "e-mail": "email",
+    "name": "name",
+    "姓名": "name",
+    "phone": "phone",
+    "電話": "phone",
+    "tags": "tags",
+    "標籤": "tags",
+}
+
+TAG_SEPARATORS = re.compile(r"[,，、;]")
+
+
+def get_import_batch_size() -> int:
+    """Get the number of users upserted per statement."""
+    return int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+
+# Upsert one batch of users (merging tags server-side), queue welcome emails
+# for newly created users if requested, and bump the user counter. New users
+# keep the address as submitted, like kiosk check-ins; an existing user whose
+# address only differs in case is updated rather than duplicated (served by
+# the lower("email") index). Timestamps are written in UTC, like Prisma's.
+# Returns the stored email of every upserted row.
+IMPORT_BATCH_SQL = '''
+WITH input AS (
+    SELECT * FROM jsonb_to_recordset($1::jsonb)
+        AS t("email" TEXT, "name" TEXT, "phone" TEXT, "tags" TEXT[])
+),
+resolved AS (
+    SELECT DISTINCT ON (input."email")
+        COALESCE(u."email", input."email") AS "email",
+        input."name",
+        input."phone",
+        input."tags"
+    FROM input
+    LEFT JOIN "User" u ON lower(u."email") = lower(input."email")
+    ORDER BY input."email", u."createdAt"
+),
+upserted AS (
+    INSERT INTO "User" ("id", "email", "name", "phone", "tags", "createdAt")
+    SELECT gen_random_uuid()::text, "email", "name", "phone", "tags", (now() AT TIME ZONE 'utc')
+    FROM resolved
+    ON CONFLICT ("email") DO UPDATE SET
+        "name" = COALESCE(EXCLUDED."name", "User"."name"),
+        "phone" = COALESCE(EXCLUDED."phone", "User"."phone"),
+        "tags" = "User"."tags" || ARRAY(
+            SELECT tag FROM unnest(EXCLUDED."tags") AS tag
+            WHERE tag <> ALL("User"."tags")
+        )
+    RETURNING "email", "name", (xmax = 0) AS "isNew"
+),
+queued AS (
+    INSERT INTO "EmailOutbox" ("id", "toEmail", "name", "emailType", "availableAt", "createdAt")
+    SELECT gen_random_uuid()::text, "email", "name", 'welcome',
+        (now() AT TIME ZONE 'utc'), (now() AT TIME ZONE 'utc')
+    FROM upserted
+    WHERE "isNew" AND $2::boolean
+),
+counted AS (
+    INSERT INTO "Counter" ("key", "value")
+    SELECT 'total_users', COUNT(*) FROM upserted WHERE "isNew"
+    ON CONFLICT ("key") DO UPDATE SET "value" = "Counter"."value" + EXCLUDED."value"
+)
+SELECT "email", "isNew" FROM upserted
+'''
+
+
+def parse_tag_field(value) -> list[str]:
+    """Parse a tags cell: a JSON/JSONL list or a separated string."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(t).strip() for t in value if str(t).strip()]
+    return [t.strip() for t in TAG_SEPARATORS.split(str(value)) if t.strip()]
+
+
+def iter_csv_rows(upload: UploadFile):
+    """Yield (row number, raw dict) from a CSV upload without loading it whole."""
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, {
+            COLUMN_ALIASES.get((key or "").strip().lower(), key): value
+            for key, value in row.items()
+        }
+
+
+def iter_jsonl_rows(upload: UploadFile):
+    """Yield (row number, raw dict) from a JSONL upload, one line at a time."""
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig")
+    for row_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, e
+            continue
+        if not isinstance(row, dict):
+            yield row_number, ValueError("Each line must be a JSON object")
+            continue
+        yield row_number, {COLUMN_ALIASES.get(k.lower(), k): v for k, v in row.items()}
+
+
+@router.post("/users")
+async def import_users(
+    file: UploadFile = File(..., description="CSV 或 JSONL 名單"),
+    tag: str | None = Query(default=None, description="額外加到每位匯入用戶的標籤"),
+    send_email: bool = Query(default=False, description="是否寄送歡迎郵件給新用戶")
+):
+    """
+    Bulk import attendees from a CSV or JSONL file.
+
+    Rows are validated with the check-in rules in a single streaming pass
+    and deduplicated by email, ignoring case (later rows fill in missing
+    fields and add tags), then upserted in batches. Welcome emails are only
+    queued for newly created users, and only when send_email is set.
+    """
+    filename = (file.filename or "").lower()
+    if filename.endswith((".jsonl", ".ndjson")):
+        rows = iter_jsonl_rows(file)
+    elif filename.endswith(".csv") or not filename:
+        rows = iter_csv_rows(file)
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file type, use .csv or .jsonl")
+
+    users: dict[str, dict] = {}
+    errors = []
+    total_rows = 0
+    duplicates = 0
+
+    try:
+        for row_number, raw in rows:
+            total_rows += 1
+            if isinstance(raw, Exception):
+                errors.append({"row": row_number, "error": str(raw)})
+                continue
+
+            try:
+                # JSONL values may be numbers etc.; coerce like CSV cells
+                request = CheckInRequest(
+                    email=str(raw.get("email") or "").strip(),
+                    name=str(raw.get("name") or "").strip() or None,
+                    phone=str(raw.get("phone") or "").strip() or None
+                )
+            except ValidationError as e:
+                errors.append({
+                    "row": row_number,
+                    "email": raw.get("email"),
+                    "error": format_validation_error(e)
+                })
+                continue
+
+            tags = parse_tag_field(raw.get("tags"))
+            if tag:
+                tags.append(tag)
+
+            key = normalize_email(request.email)
+            existing = users.get(key)
+            if existing:
+                duplicates += 1
+                existing["name"] = request.name or existing["name"]
+                existing["phone"] = request.phone or existing["phone"]
+                existing["tags"].extend(t for t in tags if t not in existing["tags"])
+            else:
+                users[key] = {
+                    "email": request.email,
+                    "name": request.name,
+                    "phone": request.phone,
+                    "tags": list(dict.fromkeys(tags))
+                }
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+
+    created = 0
+    updated = 0
+    batch_size = get_import_batch_size()
+    pending = list(users.values())
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        rows = await db.query_raw(
+            IMPORT_BATCH_SQL,
+            json.dumps(batch, ensure_ascii=False),
+            send_email
+        )
+        created += sum(1 for row in rows if row["isNew"])
+        updated += sum(1 for row in rows if not row["isNew"])
+
+        # Write through to users the check-in cache already holds, under
+        # the address as stored
+        for row in rows:
+            user = users.get(normalize_email(row["email"]))
+            if user:
+                user_cache.merge(row["email"], user["name"], user["phone"], user["tags"])
+
+    if pending:
+        bump(USERS)
+        # Live dashboards resync with a delta fetch
+        hub.publish("import", {"created": created, "updated": updated})
+
+    return {
+        "total_rows": total_rows,
+        "imported": created + updated,
+        "created": created,
+        "updated": updated,
+        "duplicates": duplicates,
+        "emails_queued": created if send_email else 0,
+        "errors": errors
+    }
@@ -0,0 +1,285 @@
+import time
+import threading
+import functools
+import inspect
+
+# Latency buckets in seconds, shared by all histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: tuple[str, ...], labelvalues: tuple, extra: str = "") -> str:
+    """Render a Prometheus label set."""
+    pairs = [
+        f'{name}="{escape_label_value(value)}"'
+        for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base class: a named metric with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+            for labels, value in items
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, callback=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: dict[tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, labels: tuple = ()):
+        with self.lock:
+            self.values[labels] = value
+
+    def render(self) -> list[str]:
+        if self.callback is not None:
+            try:
+                self.set(self.callback())
+            except Exception:
+                pass
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+            for labels, value in items
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def mean(self, labels: tuple = ()) -> float | None:
+        """Average observed value for a label set, or None before any observation."""
+        with self.lock:
+            series = self.values.get(labels)
+            if not series:
+                return None
+            count = sum(series[:-1])
+            return series[-1] / count if count else None
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = [(labels, list(series)) for labels, series in self.values.items()]
+
+        lines = self.header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status"),
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds",
+    "Prisma call latency by model and operation",
+    ("model", "operation"),
+))
+db_query_errors = registry.register(Counter(
+    "db_query_errors_total",
+    "Prisma calls that raised",
+    ("model", "operation"),
+))
+email_send_duration = registry.register(Histogram(
+    "email_send_duration_seconds",
+    "Email transport send latency",
+    ("transport",),
+))
+email_send_total = registry.register(Counter(
+    "email_send_total",
+    "Emails sent by outcome",
+    ("transport", "status"),
+))
+campaign_recipients_total = registry.register(Counter(
+    "campaign_recipients_total",
+    "Campaign recipients processed by outcome",
+    ("status",),
+))
+campaign_recipients_per_second = registry.register(Gauge(
+    "campaign_recipients_per_second",
+    "Send rate of the most recently finished campaign",
+))
+user_cache_lookups = registry.register(Counter(
+    "user_cache_lookups_total",
+    "Check-in user cache lookups by result",
+    ("result",),
+))
+response_cache_requests = registry.register(Counter(
+    "response_cache_requests_total",
+    "Cached GET responses by result (hit, miss, not_modified)",
+    ("key", "result"),
+))
+
+
+def register_gauge_callback(name: str, documentation: str, callback) -> Gauge:
+    """Register a gauge whose value is computed at scrape time."""
+    return registry.register(Gauge(name, documentation, callback=callback))
+
+
+def render_metrics() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    return registry.render()
+
+
+# ===== Prisma instrumentation =====
+
+def instrument_prisma():
+    """
+    Time every generated Prisma model action and raw query.
+
+    Wraps the generated *Actions classes once at import, so model calls on
+    both the main client and transaction clients are recorded.
+    """
+    from prisma import actions, Prisma
+
+    def wrap(func, model: str, operation: str):
+        labels = (model, operation)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                db_query_errors.inc(labels)
+                raise
+            finally:
+                db_query_duration.observe(time.perf_counter() - start, labels)
+
+        wrapper.__instrumented__ = True
+        return wrapper
+
+    for class_name, cls in inspect.getmembers(actions, inspect.isclass):
+        if not class_name.endswith("Actions") or cls.__module__ != actions.__name__:
+            continue
+        model = class_name[: -len("Actions")]
+        for name, func in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(func):
+                continue
+            if getattr(func, "__instrumented__", False):
+                continue
+            setattr(cls, name, wrap(func, model, name))
+
+    for name in ("query_raw", "query_first", "execute_raw"):
+        func = getattr(Prisma, name, None)
+        if func is not None and not getattr(func, "__instrumented__", False):
+            setattr(Prisma, name, wrap(func, "raw", name))
+
+
+# ===== HTTP middleware =====
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template."""
+
+    def __init__(self, app, exclude_paths: tuple[str, ...] = ()):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by route template to keep cardinality bounded
+            route_path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                (scope["method"], route_path, str(status)),
+            )
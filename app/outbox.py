@@ -0,0 +1,186 @@
+import os
+import asyncio
+from datetime import timedelta
+
+from app.db import db
+from app.config import utcnow
+from app.gmail import send_welcome_email
+from app.rate_limit import EmailDeferred
+
+_worker_task: asyncio.Task | None = None
+
+
+def get_outbox_batch_size() -> int:
+    """Get the number of outbox rows claimed per drain pass."""
+    return int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+
+
+def get_outbox_poll_interval() -> float:
+    """Get the idle wait between drain passes, in seconds."""
+    return float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+
+
+def get_outbox_max_attempts() -> int:
+    """Get the number of attempts before a message is marked failed."""
+    return int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+
+def is_outbox_worker_enabled() -> bool:
+    """Whether this process should run the drain loop."""
+    return os.getenv("OUTBOX_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+# Lease on claimed rows; a worker that dies mid-batch releases them after this
+OUTBOX_LEASE_SECONDS = 300
+
+
+async def claim_outbox_batch(limit: int) -> list[dict]:
+    """
+    Atomically claim up to `limit` due messages.
+
+    Rows are locked with SKIP LOCKED and moved to `sending` with a lease,
+    so concurrent drain loops never pick up the same message.
+    """
+    return await db.query_raw(
+        '''
+        UPDATE "EmailOutbox"
+        SET "status" = 'sending',
+            "attempts" = "attempts" + 1,
+            "availableAt" = (now() AT TIME ZONE 'utc') + make_interval(secs => $2)
+        WHERE "id" IN (
+            SELECT "id" FROM "EmailOutbox"
+            WHERE "status" IN ('pending', 'sending')
+              AND "availableAt" <= (now() AT TIME ZONE 'utc')
+            ORDER BY "availableAt"
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING "id", "toEmail", "name", "emailType", "attempts"
+        ''',
+        limit,
+        OUTBOX_LEASE_SECONDS
+    )
+
+
+async def deliver_outbox_message(message: dict):
+    """Send one claimed message and record the outcome."""
+    try:
+        success = await send_welcome_email(message["toEmail"], message["name"])
+    except EmailDeferred as e:
+        # Held back by the sending quota: requeue without using up an attempt
+        await db.emailoutbox.update(
+            where={"id": message["id"]},
+            data={
+                "status": "pending",
+                "availableAt": e.retry_at,
+                "attempts": max(message["attempts"] - 1, 0),
+                "lastError": e.reason
+            }
+        )
+        return
+
+    if success:
+        await db.emailoutbox.update(
+            where={"id": message["id"]},
+            data={"status": "sent", "sentAt": utcnow(), "lastError": None}
+        )
+        return
+
+    attempts = message["attempts"]
+    if attempts >= get_outbox_max_attempts():
+        data = {"status": "failed", "lastError": "Failed to send"}
+    else:
+        # Exponential backoff: 30s, 60s, 120s, ...
+        retry_at = utcnow() + timedelta(seconds=30 * 2 ** (attempts - 1))
+        data = {"status": "pending", "availableAt": retry_at, "lastError": "Failed to send"}
+
+    await db.emailoutbox.update(where={"id": message["id"]}, data=data)
+
+
+async def drain_outbox_once() -> int:
+    """Claim and deliver one batch. Returns the number of messages processed."""
+    batch = await claim_outbox_batch(get_outbox_batch_size())
+    if not batch:
+        return 0
+
+    # Sends are bounded by the shared Gmail thread pool
+    async def deliver(message: dict):
+        try:
+            await deliver_outbox_message(message)
+        except Exception as e:
+            # Leave the row leased; it is retried once the lease expires
+            print(f"[Outbox] Error delivering {message['id']}: {e}")
+
+    await asyncio.gather(*(deliver(message) for message in batch))
+    print(f"[Outbox] Processed {len(batch)} messages")
+    return len(batch)
+
+
+async def run_outbox_worker():
+    """Drain the outbox until cancelled."""
+    print("[Outbox] Worker started")
+    while True:
+        try:
+            processed = await drain_outbox_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Outbox] Drain error: {e}")
+            processed = 0
+
+        if processed == 0:
+            await asyncio.sleep(get_outbox_poll_interval())
+
+
+async def get_outbox_stats() -> dict:
+    """Get outbox queue depth and lag."""
+    pending = await db.emailoutbox.count(where={"status": {"in": ["pending", "sending"]}})
+    failed = await db.emailoutbox.count(where={"status": "failed"})
+    oldest = await db.emailoutbox.find_first(
+        where={"status": {"in": ["pending", "sending"]}},
+        order={"createdAt": "asc"}
+    )
+
+    lag_seconds = (utcnow() - oldest.createdAt).total_seconds() if oldest else 0.0
+
+    return {
+        "pending": pending,
+        "failed": failed,
+        "oldest_pending_at": oldest.createdAt if oldest else None,
+        "lag_seconds": round(lag_seconds, 3)
+    }
+
+
+def start_outbox_worker():
+    """Start the drain loop as a background task."""
+    global _worker_task
+    if not is_outbox_worker_enabled():
+        print("[Outbox] Worker disabled in this process")
+        return
+    if _worker_task is None or _worker_task.done():
+        _worker_task = asyncio.create_task(run_outbox_worker())
+
+
+async def stop_outbox_worker():
+    """Stop the drain loop."""
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+        print("[Outbox] Worker stopped")
+
+
+if __name__ == "__main__":
+    # Standalone drain process: `python -m app.outbox`
+    async def main():
+        await db.connect()
+        try:
+            await run_outbox_worker()
+        finally:
+            await db.disconnect()
+
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from app.db import db
+from app.metrics import register_gauge_callback
+
+# The sending day rolls over at local midnight, matching the scheduler
+QUOTA_TIMEZONE = ZoneInfo("Asia/Taipei")
+
+
+class EmailQuotaError(Exception):
+    """Raised by a transport when the provider rejects a send for quota."""
+
+    def __init__(self, message: str, retry_after: float | None = None, daily: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.daily = daily
+
+
+class EmailDeferred(Exception):
+    """Raised by send_email when a recipient must be retried later, not failed."""
+
+    def __init__(self, retry_at: datetime, reason: str):
+        super().__init__(f"Email deferred until {retry_at.isoformat()}: {reason}")
+        self.retry_at = retry_at
+        self.reason = reason
+
+
+def get_rate_per_second() -> float:
+    """Get the maximum sends per second for this process (0 = unlimited)."""
+    return float(os.getenv("EMAIL_RATE_PER_SECOND", "10"))
+
+
+def get_daily_limit() -> int:
+    """Get the maximum sends per day across all workers (0 = unlimited)."""
+    return int(os.getenv("EMAIL_DAILY_LIMIT", "0"))
+
+
+def get_quota_max_retries() -> int:
+    """Get how many times a throttled send is retried before it is deferred."""
+    return int(os.getenv("EMAIL_QUOTA_MAX_RETRIES", "5"))
+
+
+def next_quota_reset() -> datetime:
+    """When the daily sending budget next resets."""
+    local_now = datetime.now(QUOTA_TIMEZONE)
+    tomorrow = (local_now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return tomorrow.astimezone(timezone.utc)
+
+
+def daily_sent_key() -> str:
+    """Counter key for today's sends."""
+    return f"emails_sent:{datetime.now(QUOTA_TIMEZONE).date().isoformat()}"
+
+
+# Take one unit of today's budget, returning no row once it is spent
+RESERVE_DAILY_SEND_SQL = '''
+INSERT INTO "Counter" ("key", "value") VALUES ($1, 1)
+ON CONFLICT ("key") DO UPDATE SET "value" = "Counter"."value" + 1
+WHERE "Counter"."value" < $2
+RETURNING "value"
+'''
+
+REFUND_DAILY_SEND_SQL = '''
+UPDATE "Counter" SET "value" = "value" - 1
+WHERE "key" = $1 AND "value" > 0
+'''
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket that paces sends to a target rate and adapts it to the
+    provider's feedback.
+
+    A quota error halves the rate and pauses every sender until the
+    provider's Retry-After (or an exponential backoff) has passed; each
+    success then raises the rate additively back toward the configured
+    ceiling.
+    """
+
+    def __init__(self, max_rate: float):
+        self.max_rate = max_rate
+        self.min_rate = min(max_rate, 0.5)
+        self.rate = max_rate
+        self.tokens = max(max_rate, 1.0)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a send is allowed."""
+        if self.rate <= 0 and self.paused_until <= time.monotonic():
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                if self.rate <= 0:
+                    return
+
+                self.tokens = min(
+                    max(self.rate, 1.0),
+                    self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self, retry_after: float):
+        """Slow down after the provider rejected a send for quota."""
+        if self.rate > 0:
+            self.rate = max(self.min_rate, self.rate / 2)
+        elif self.max_rate <= 0:
+            # No configured ceiling: start pacing from a conservative rate
+            self.rate = 1.0
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        """Recover toward the configured rate after a successful send."""
+        if self.rate <= 0:
+            return
+        ceiling = self.max_rate if self.max_rate > 0 else float("inf")
+        self.rate = min(ceiling, self.rate + max(self.max_rate, 1.0) / 20)
+        if self.max_rate <= 0 and self.rate >= 50:
+            # Back to unlimited once well clear of the provider's limits
+            self.rate = 0
+
+
+_limiter: AdaptiveRateLimiter | None = None
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Get the process-wide email rate limiter."""
+    global _limiter
+    if _limiter is None:
+        _limiter = AdaptiveRateLimiter(get_rate_per_second())
+    return _limiter
+
+
+register_gauge_callback(
+    "email_send_rate_limit",
+    "Current adaptive email send rate limit per second (0 = unlimited)",
+    lambda: get_rate_limiter().rate
+)
+
+
+async def reserve_daily_send() -> str | None:
+    """
+    Take one send from today's budget.
+
+    Raises EmailDeferred once EMAIL_DAILY_LIMIT sends have been made today.
+    The budget is a shared Counter row, so it holds across workers and
+    restarts. Returns the counter key to pass to refund_daily_send if the
+    email ends up not being sent (None when there is no daily limit).
+    """
+    limit = get_daily_limit()
+    if limit <= 0:
+        return None
+
+    key = daily_sent_key()
+    reserved = await db.query_raw(RESERVE_DAILY_SEND_SQL, key, limit)
+    if not reserved:
+        raise EmailDeferred(next_quota_reset(), "Daily sending limit reached")
+    return key
+
+
+async def get_daily_sends_remaining() -> int | None:
+    """Get how many sends today's budget still allows (None = unlimited)."""
+    limit = get_daily_limit()
+    if limit <= 0:
+        return None
+    counter = await db.counter.find_unique(where={"key": daily_sent_key()})
+    return max(0, limit - (counter.value if counter else 0))
+
+
+async def refund_daily_send(key: str | None):
+    """Give back a send reserved by reserve_daily_send."""
+    if key is None:
+        return
+    await db.execute_raw(REFUND_DAILY_SEND_SQL, key)
+
+
+def throttle_backoff(attempt: int) -> float:
+    """Seconds to pause after the nth consecutive quota error."""
+    return min(60.0, 2.0 ** attempt)
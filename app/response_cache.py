@@ -0,0 +1,114 @@
+import os
+import time
+import hashlib
+from collections import defaultdict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.metrics import response_cache_requests
+
+# Data sets that cached responses depend on
+USERS = "users"
+SCHEDULED_EMAILS = "scheduled_emails"
+
+
+def get_response_cache_ttl() -> float:
+    """
+    Get how long a rendered body is reused without re-reading the database.
+
+    Versions are per process, so this bounds how long a change made by
+    another worker can go unseen.
+    """
+    return float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+
+class ResponseCache:
+    """
+    Rendered JSON bodies for rarely changing GET endpoints.
+
+    Each entry records the versions of the data sets it was rendered from;
+    writes bump those versions (see bump), which makes dependent entries
+    stale. The ETag is a hash of the body, so it stays valid across
+    re-renders and across workers.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.versions: defaultdict[str, int] = defaultdict(int)
+        self.entries: dict[str, tuple[tuple[int, ...], float, bytes, str]] = {}
+
+    def bump(self, *datasets: str):
+        """Record that the given data sets changed."""
+        for name in datasets:
+            self.versions[name] += 1
+
+    def lookup(self, key: str, depends: tuple[str, ...]) -> tuple[bytes, str] | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        versions, stored_at, body, etag = entry
+        if versions != self.current_versions(depends):
+            return None
+        if depends and time.monotonic() - stored_at > self.ttl:
+            return None
+        return body, etag
+
+    def store(self, key: str, versions: tuple[int, ...], body: bytes) -> str:
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.entries[key] = (versions, time.monotonic(), body, etag)
+        return etag
+
+    def current_versions(self, depends: tuple[str, ...]) -> tuple[int, ...]:
+        return tuple(self.versions[name] for name in depends)
+
+
+response_cache = ResponseCache(get_response_cache_ttl())
+
+
+def bump(*datasets: str):
+    """Invalidate cached responses that depend on the given data sets."""
+    response_cache.bump(*datasets)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+async def cached_response(
+    request: Request,
+    key: str,
+    depends: tuple[str, ...],
+    render
+) -> Response:
+    """
+    Serve a JSON response from the cache, answering 304 when the client
+    already has the current body.
+
+    `render` is an async callable returning the JSON-able payload; it only
+    runs when the cached body is missing or stale. Endpoints with no
+    dependencies (static data) are cached for the life of the process.
+    """
+    cached = response_cache.lookup(key, depends)
+    if cached is None:
+        # Capture versions before reading, so a concurrent write wins
+        versions = response_cache.current_versions(depends)
+        body = JSONResponse(jsonable_encoder(await render())).body
+        etag = response_cache.store(key, versions, body)
+        result = "miss"
+    else:
+        body, etag = cached
+        result = "hit"
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        response_cache_requests.inc((key, "not_modified"))
+        return Response(status_code=304, headers=headers)
+
+    response_cache_requests.inc((key, result))
+    return Response(content=body, media_type="application/json", headers=headers)
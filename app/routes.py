@@ -2,193 +2,622 @@ import os
 import csv
 import io
 import json
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
 
-from fastapi import APIRouter, BackgroundTasks, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-
-from app.db import db
-from app.schemas import CheckInRequest, CheckInResponse
-from app.gmail import send_welcome_email
+from pydantic import ValidationError
+
+from app.config import get_event_name
+from app.db import db, read_db, READ_LAG_ALLOWANCE
+from app.schemas import (
+    CheckInRequest,
+    CheckInResponse,
+    BatchCheckInItem,
+    BatchCheckInRequest,
+    BatchCheckInResponse,
+    BatchCheckInItemResult,
+    format_validation_error,
+)
+from app.outbox import get_outbox_stats
+from app.events import hub
+from app.stats import TOTAL_USERS, TOTAL_CHECKINS, event_checkins_key, get_counters
+from app.user_cache import user_cache, cache_user_row
+from app.response_cache import USERS, bump, cached_response
 
 router = APIRouter()
 
 
-def get_event_name() -> str:
-    """Get current event name from environment variable."""
-    return os.getenv("EVENT_NAME", "2026春季招生活動")
+# Upsert the user (appending the event tag server-side), insert the EventLog
+# row, optionally queue the welcome email and bump the stats counters (unless
+# $7 is false: batches bump them once, see COUNT_CHECK_INS_SQL), all in one
+# statement. The new row and counter values are returned for live updates.
+# ON CONFLICT makes concurrent check-ins with the same email safe. An
+# existing user whose address differs only in case is reused (served by the
+# lower("email") index). When an idempotency key is given, a CheckInReceipt
+# row is written as well. Timestamps are written explicitly in UTC, like the
+# rows Prisma writes; the column defaults would use the session time zone.
+CHECK_IN_SQL = '''
+WITH existing AS (
+    SELECT "email" FROM "User"
+    WHERE lower("email") = lower($1)
+    ORDER BY "createdAt"
+    LIMIT 1
+),
+upserted AS (
+    INSERT INTO "User" ("id", "email", "name", "phone", "tags", "createdAt")
+    VALUES (
+        gen_random_uuid()::text,
+        COALESCE((SELECT "email" FROM existing), $1),
+        NULLIF($2, ''),
+        NULLIF($3, ''),
+        ARRAY[$4::text],
+        (now() AT TIME ZONE 'utc')
+    )
+    ON CONFLICT ("email") DO UPDATE SET
+        "name" = COALESCE(EXCLUDED."name", "User"."name"),
+        "phone" = COALESCE(EXCLUDED."phone", "User"."phone"),
+        "tags" = CASE
+            WHEN $4::text = ANY("User"."tags") THEN "User"."tags"
+            ELSE array_append("User"."tags", $4::text)
+        END
+    RETURNING "id", "email", "name", "phone", "tags", "createdAt", (xmax = 0) AS "isNew"
+),
+logged AS (
+    INSERT INTO "EventLog" ("id", "eventName", "userId", "checkInAt")
+    SELECT gen_random_uuid()::text, $4::text, "id", (now() AT TIME ZONE 'utc') FROM upserted
+    RETURNING "checkInAt"
+),
+queued AS (
+    INSERT INTO "EmailOutbox" ("id", "toEmail", "name", "emailType", "availableAt", "createdAt")
+    SELECT gen_random_uuid()::text, $1, NULLIF($2, ''), 'welcome',
+        (now() AT TIME ZONE 'utc'), (now() AT TIME ZONE 'utc')
+    FROM upserted
+    WHERE $5::boolean
+),
+counted AS (
+    INSERT INTO "Counter" ("key", "value")
+    SELECT c."key", c."value" FROM upserted, LATERAL (VALUES
+        ('total_users', CASE WHEN upserted."isNew" THEN 1 ELSE 0 END),
+        ('total_checkins', 1),
+        ('event_checkins:' || $4::text, 1)
+    ) AS c("key", "value")
+    WHERE $7::boolean
+    ON CONFLICT ("key") DO UPDATE SET "value" = "Counter"."value" + EXCLUDED."value"
+    RETURNING "key", "value"
+),
+receipt AS (
+    INSERT INTO "CheckInReceipt" ("key", "userId", "isNewUser", "createdAt")
+    SELECT $6::text, "id", "isNew", (now() AT TIME ZONE 'utc') FROM upserted
+    WHERE $6::text IS NOT NULL
+)
+SELECT
+    upserted.*,
+    (SELECT "checkInAt" FROM logged) AS "checkInAt",
+    (SELECT json_object_agg("key", "value") FROM counted)::text AS "counters"
+FROM upserted
+'''
+
+
+# Fast path for a cached returning visitor who already has the event tag and
+# brings no new name or phone: the User row is left untouched, so only the
+# EventLog, outbox, counter and receipt rows are written. The "known" guard
+# turns a user deleted since it was cached into an empty result instead of
+# a foreign key error, so the caller can fall back to CHECK_IN_SQL.
+CHECK_IN_KNOWN_USER_SQL = '''
+WITH known AS (
+    SELECT "id" FROM "User" WHERE "id" = $1
+),
+logged AS (
+    INSERT INTO "EventLog" ("id", "eventName", "userId", "checkInAt")
+    SELECT gen_random_uuid()::text, $2::text, "id", (now() AT TIME ZONE 'utc') FROM known
+    RETURNING "checkInAt"
+),
+queued AS (
+    INSERT INTO "EmailOutbox" ("id", "toEmail", "name", "emailType", "availableAt", "createdAt")
+    SELECT gen_random_uuid()::text, $3, NULLIF($4, ''), 'welcome',
+        (now() AT TIME ZONE 'utc'), (now() AT TIME ZONE 'utc')
+    FROM known
+    WHERE $5::boolean
+),
+counted AS (
+    INSERT INTO "Counter" ("key", "value")
+    SELECT c."key", c."value" FROM known, LATERAL (VALUES
+        ('total_users', 0),
+        ('total_checkins', 1),
+        ('event_checkins:' || $2::text, 1)
+    ) AS c("key", "value")
+    WHERE $7::boolean
+    ON CONFLICT ("key") DO UPDATE SET "value" = "Counter"."value" + EXCLUDED."value"
+    RETURNING "key", "value"
+),
+receipt AS (
+    INSERT INTO "CheckInReceipt" ("key", "userId", "isNewUser", "createdAt")
+    SELECT $6::text, "id", false, (now() AT TIME ZONE 'utc') FROM known
+    WHERE $6::text IS NOT NULL
+)
+SELECT
+    (SELECT "checkInAt" FROM logged) AS "checkInAt",
+    (SELECT json_object_agg("key", "value") FROM counted)::text AS "counters"
+'''
+
+
+# Bump the stats counters for a whole batch of check-ins. Keys are listed in
+# the same order as in CHECK_IN_SQL, so their row locks are always taken in
+# one order.
+COUNT_CHECK_INS_SQL = '''
+INSERT INTO "Counter" ("key", "value")
+VALUES
+    ('total_users', $1::int),
+    ('total_checkins', $2::int),
+    ('event_checkins:' || $3::text, $2::int)
+ON CONFLICT ("key") DO UPDATE SET "value" = "Counter"."value" + EXCLUDED."value"
+RETURNING "key", "value"
+'''
+
+
+def check_in_message(is_new_user: bool) -> str:
+    """Kiosk message for a completed check-in."""
+    if is_new_user:
+        return "打卡成功！歡迎加入！"
+    return "歡迎回來！已更新您的資料。"
+
+
+async def run_check_in(
+    client,
+    request: CheckInRequest,
+    event_name: str,
+    idempotency_key: str | None = None,
+    count: bool = True
+) -> dict:
+    """
+    Run the single-statement check-in on a client or transaction.
+
+    Returning visitors found in the user cache with nothing to change skip
+    the User upsert. Once the check-in is committed, callers write the
+    returned row to the cache (see cache_user_row) and, if its
+    ``userUpdated`` is set, bump the USERS response cache. With
+    ``count=False`` the stats counters are left alone and the row's
+    ``counters`` is None; the caller bumps them itself.
+    """
+    cached = user_cache.get(request.email)
+    if (
+        cached
+        and event_name in cached.tags
+        and (not request.name or request.name == cached.name)
+        and (not request.phone or request.phone == cached.phone)
+    ):
+        rows = await client.query_raw(
+            CHECK_IN_KNOWN_USER_SQL,
+            cached.id,
+            event_name,
+            request.email,
+            request.name,
+            request.send_email,
+            idempotency_key,
+            count
+        )
+        if rows and rows[0]["checkInAt"] is not None:
+            return {
+                "id": cached.id,
+                "email": request.email,
+                "name": cached.name,
+                "phone": cached.phone,
+                "tags": list(cached.tags),
+                "createdAt": cached.created_at,
+                "isNew": False,
+                "userUpdated": False,
+                **rows[0]
+            }
+        # Deleted since it was cached
+        user_cache.invalidate(request.email)
+
+    # May create the user or add a tag
+    rows = await client.query_raw(
+        CHECK_IN_SQL,
+        request.email,
+        request.name,
+        request.phone,
+        event_name,
+        request.send_email,
+        idempotency_key,
+        count
+    )
+    return {**rows[0], "userUpdated": True}
+
+
+def publish_check_in(row: dict, event_name: str, counters: dict):
+    """Broadcast a completed check-in, with counter values by key, to live dashboards."""
+    hub.publish("checkin", {
+        "is_new_user": row["isNew"],
+        "user": {
+            "id": row["id"],
+            "email": row["email"],
+            "name": row["name"],
+            "phone": row["phone"],
+            "tags": row["tags"],
+            "createdAt": row["createdAt"],
+            "last_checkin_at": row["checkInAt"]
+        },
+        "stats": {
+            "total_users": counters[TOTAL_USERS],
+            "total_checkins": counters[TOTAL_CHECKINS],
+            "event_checkins": counters[event_checkins_key(event_name)]
+        }
+    })
 
 
-def parse_tags(tags_str: str) -> list[str]:
-    """Parse JSON tags string to list."""
-    try:
-        return json.loads(tags_str) if tags_str else []
-    except:
-        return []
+@router.post("/check-in", response_model=CheckInResponse)
+async def check_in_user(request: CheckInRequest):
+    """
+    Check in a user for the event.
 
+    The user upsert, the EventLog row and (if requested) the welcome email
+    outbox entry are written atomically in a single round trip; the email
+    itself is sent later by the outbox drain loop.
+    """
+    event_name = get_event_name()
 
-def serialize_tags(tags: list[str]) -> str:
-    """Serialize tags list to JSON string."""
-    return json.dumps(tags, ensure_ascii=False)
+    row = await run_check_in(db, request, event_name)
+    # Bump only after the write, so a concurrent read cannot cache the old
+    # data under the new version
+    if row["userUpdated"]:
+        bump(USERS)
+    cache_user_row(row)
+    publish_check_in(row, event_name, json.loads(row["counters"]))
 
+    return CheckInResponse(
+        success=True,
+        message=check_in_message(row["isNew"]),
+        is_new_user=row["isNew"],
+        email_sent=request.send_email
+    )
 
-@router.post("/check-in", response_model=CheckInResponse)
-async def check_in_user(
-    request: CheckInRequest,
-    background_tasks: BackgroundTasks
-):
-    """
-    Check in a user for the event.
+
+# Longest a batch check-in transaction may stay open
+BATCH_CHECK_IN_TIMEOUT = timedelta(seconds=30)
+
+
+def invalid_item_result(raw: dict, error: ValidationError) -> BatchCheckInItemResult:
+    """Result for a batch item that failed validation."""
+    key = raw.get("idempotency_key")
+    return BatchCheckInItemResult(
+        idempotency_key=key if isinstance(key, str) else None,
+        success=False,
+        message=format_validation_error(error),
+        is_new_user=False,
+        email_sent=False,
+        replayed=False,
+        invalid=True
+    )
+
+
+@router.post("/check-in/batch", response_model=BatchCheckInResponse)
+async def check_in_batch(request: BatchCheckInRequest):
     """
-    existing_user = await db.user.find_unique(where={"email": request.email})
+    Check in a batch of queued kiosk submissions in one transaction.
 
-    is_new_user = existing_user is None
-    email_sent = False
-    event_name = get_event_name()
+    Each item carries a client-generated idempotency key. Keys are locked
+    for the duration of the transaction, and items whose key has already
+    been processed are answered from their stored receipt instead of
+    being checked in again, so retried flushes never duplicate EventLogs.
 
-    if existing_user:
-        # Update existing user
-        current_tags = parse_tags(existing_user.tags)
-        if event_name not in current_tags:
-            current_tags.append(event_name)
-
-        update_data = {"tags": serialize_tags(current_tags)}
-        if request.name:
-            update_data["name"] = request.name
-        if request.phone:
-            update_data["phone"] = request.phone
-
-        user = await db.user.update(
-            where={"id": existing_user.id},
-            data=update_data
-        )
-        message = "歡迎回來！已更新您的資料。"
-    else:
-        # Create new user
-        user = await db.user.create(
-            data={
-                "email": request.email,
-                "name": request.name,
-                "phone": request.phone,
-                "tags": serialize_tags([event_name])
-            }
-        )
-        message = "打卡成功！歡迎加入！"
+    Items are validated individually: a malformed one gets an ``invalid``
+    result at its index and the rest of the batch is still checked in.
 
-    # Create EventLog
-    await db.eventlog.create(
-        data={
-            "eventName": event_name,
-            "userId": user.id
-        }
+    Items are checked in in email order, so concurrent batches lock User
+    rows in a consistent order, and the hot counter rows are bumped once,
+    by the last statement, so their locks are held only until the commit.
+    """
+    event_name = get_event_name()
+
+    items: list[BatchCheckInItem | None] = []
+    invalid: dict[int, BatchCheckInItemResult] = {}
+    for index, raw in enumerate(request.items):
+        try:
+            items.append(BatchCheckInItem.model_validate(raw))
+        except ValidationError as e:
+            items.append(None)
+            invalid[index] = invalid_item_result(raw, e)
+
+    valid = [item for item in items if item is not None]
+    keys = sorted({item.idempotency_key for item in valid})
+
+    results: dict[str, BatchCheckInItemResult] = {}
+    published = []
+    counters = None
+
+    if valid:
+        async with db.tx(timeout=BATCH_CHECK_IN_TIMEOUT) as tx:
+            # Serialize concurrent flushes that share keys
+            await tx.query_raw(
+                'SELECT pg_advisory_xact_lock(hashtext(k)) FROM jsonb_array_elements_text($1::jsonb) AS k',
+                json.dumps(keys)
+            )
+
+            receipts = await tx.checkinreceipt.find_many(where={"key": {"in": keys}})
+            for receipt in receipts:
+                results[receipt.key] = BatchCheckInItemResult(
+                    idempotency_key=receipt.key,
+                    success=True,
+                    message=check_in_message(receipt.isNewUser),
+                    is_new_user=receipt.isNewUser,
+                    email_sent=False,
+                    replayed=True
+                )
+
+            for item in sorted(valid, key=lambda item: item.email.lower()):
+                if item.idempotency_key in results:
+                    continue
+
+                row = await run_check_in(tx, item, event_name, item.idempotency_key, count=False)
+                published.append(row)
+                results[item.idempotency_key] = BatchCheckInItemResult(
+                    idempotency_key=item.idempotency_key,
+                    success=True,
+                    message=check_in_message(row["isNew"]),
+                    is_new_user=row["isNew"],
+                    email_sent=item.send_email,
+                    replayed=False
+                )
+
+            if published:
+                counted = await tx.query_raw(
+                    COUNT_CHECK_INS_SQL,
+                    sum(1 for row in published if row["isNew"]),
+                    len(published),
+                    event_name
+                )
+                counters = {row["key"]: row["value"] for row in counted}
+
+    # Only cache rows and bump once the transaction has committed
+    if any(row["userUpdated"] for row in published):
+        bump(USERS)
+    for row in published:
+        cache_user_row(row)
+        publish_check_in(row, event_name, counters)
+
+    return BatchCheckInResponse(
+        results=[
+            invalid[index] if item is None else results[item.idempotency_key]
+            for index, item in enumerate(items)
+        ]
     )
 
-    # Send welcome email in background if requested
-    if request.send_email:
-        background_tasks.add_task(send_welcome_email, request.email, request.name)
-        email_sent = True
 
-    return CheckInResponse(
-        success=True,
-        message=message,
-        is_new_user=is_new_user,
-        email_sent=email_sent
+def keyset_after(created_at: datetime, user_id: str) -> dict:
+    """Build a where clause for users strictly after a (createdAt, id) cursor."""
+    return {
+        "OR": [
+            {"createdAt": {"lt": created_at}},
+            {"createdAt": created_at, "id": {"lt": user_id}},
+        ]
+    }
+
+
+def encode_cursor(user) -> str:
+    """Encode a user's (createdAt, id) position as an opaque cursor."""
+    return f"{user.createdAt.isoformat()}|{user.id}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        created_at, user_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), user_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_checkin_summaries(user_ids: list[str]) -> dict[str, dict]:
+    """Get check-in count and last check-in time for each user."""
+    if not user_ids:
+        return {}
+
+    groups = await read_db.eventlog.group_by(
+        by=["userId"],
+        where={"userId": {"in": user_ids}},
+        count={"_all": True},
+        max={"checkInAt": True}
     )
+    return {
+        g["userId"]: {
+            "checkin_count": g["_count"]["_all"],
+            "last_checkin_at": g["_max"]["checkInAt"]
+        }
+        for g in groups
+    }
+
+
+# Rows are stamped with their transaction's start time, so one committed
+# after the watermark can still carry an earlier timestamp; the overlap
+# covers the longest write transaction (the batch check-in)
+DELTA_OVERLAP = BATCH_CHECK_IN_TIMEOUT
+
+
+async def get_delta_watermark() -> datetime:
+    """
+    Get the point a later ``since`` query should resume from, taken from the
+    primary database's clock (the one that stamps the rows) rather than the
+    app server's.
+    """
+    rows = await db.query_raw('SELECT now() AS "now"')
+    return rows[0]["now"] - READ_LAG_ALLOWANCE - DELTA_OVERLAP
 
 
 @router.get("/users")
-async def get_users():
-    """Get all users with their check-in logs."""
-    users = await db.user.find_many(
-        include={"logs": True},
-        order={"createdAt": "desc"}
+async def get_users(
+    limit: int = Query(default=200, ge=1, le=1000, description="每頁筆數"),
+    cursor: str | None = Query(default=None, description="上一頁回傳的 next_cursor"),
+    since: datetime | None = Query(default=None, description="只回傳此時間後建立或打卡的用戶")
+):
+    """
+    Get users newest first, one page at a time, with check-in summaries.
+
+    Pass ``since`` (the ``watermark`` of a previous response) to fetch only
+    users created or checked in after it. Delta pages overlap the previous
+    fetch a little, so clients should merge them by user id.
+    """
+    watermark = await get_delta_watermark()
+
+    conditions = []
+    if since:
+        conditions.append({
+            "OR": [
+                {"createdAt": {"gt": since}},
+                {"logs": {"some": {"checkInAt": {"gt": since}}}},
+            ]
+        })
+    if cursor:
+        conditions.append(keyset_after(*decode_cursor(cursor)))
+
+    users = await read_db.user.find_many(
+        where={"AND": conditions} if conditions else None,
+        order=[{"createdAt": "desc"}, {"id": "desc"}],
+        take=limit
     )
+    summaries = await get_checkin_summaries([user.id for user in users])
 
-    # Parse tags for each user
     result = []
     for user in users:
-        user_dict = {
+        summary = summaries.get(user.id, {})
+        result.append({
             "id": user.id,
             "email": user.email,
             "name": user.name,
             "phone": user.phone,
-            "tags": parse_tags(user.tags),
+            "tags": user.tags,
             "createdAt": user.createdAt,
-            "logs": user.logs
-        }
-        result.append(user_dict)
+            "checkin_count": summary.get("checkin_count", 0),
+            "last_checkin_at": summary.get("last_checkin_at")
+        })
 
-    return result
+    return {
+        "users": result,
+        "next_cursor": encode_cursor(users[-1]) if len(users) == limit else None,
+        "watermark": watermark
+    }
 
 
 @router.get("/event")
-async def get_event():
+async def get_event(request: Request):
     """Get current event info."""
-    return {"event_name": get_event_name()}
+    async def render():
+        return {"event_name": get_event_name()}
+
+    return await cached_response(request, "event", (), render)
 
 
 @router.get("/stats")
 async def get_stats():
-    """Get check-in statistics."""
-    total_users = await db.user.count()
-    total_checkins = await db.eventlog.count()
-    event_checkins = await db.eventlog.count(
-        where={"eventName": get_event_name()}
-    )
+    """Get check-in statistics from the materialized counters."""
+    return await get_counters(get_event_name())
 
-    return {
-        "total_users": total_users,
-        "total_checkins": total_checkins,
-        "event_checkins": event_checkins
-    }
+
+@router.get("/outbox")
+async def get_outbox_status():
+    """Get welcome email outbox queue depth and lag."""
+    return await get_outbox_stats()
 
 
 @router.get("/tags")
-async def get_all_tags():
-    """Get all unique tags from users."""
-    users = await db.user.find_many()
-    all_tags = set()
-    for user in users:
-        tags = parse_tags(user.tags)
-        all_tags.update(tags)
-    return sorted(list(all_tags))
+async def get_all_tags(request: Request):
+    """Get all unique tags from users (cached until users change)."""
+    async def render():
+        rows = await read_db.query_raw(
+            'SELECT DISTINCT unnest("tags") AS tag FROM "User" ORDER BY tag'
+        )
+        return [row["tag"] for row in rows]
 
+    return await cached_response(request, "tags", (USERS,), render)
 
-@router.get("/export/csv")
-async def export_users_csv(
-    tag: str = Query(default=None, description="篩選特定標籤的用戶")
-):
-    """Export users to CSV file."""
-    users = await db.user.find_many(order={"createdAt": "desc"})
 
-    # Filter by tag if specified
-    if tag:
-        users = [u for u in users if tag in parse_tags(u.tags)]
+def get_export_batch_size() -> int:
+    """Get CSV export page size from environment variable."""
+    return int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+
+async def iter_users_keyset(where: dict | None = None, batch_size: int = 1000):
+    """
+    Iterate users newest first, one page at a time.
+
+    Pages are fetched by (createdAt, id) keyset instead of OFFSET, so each
+    page costs the same no matter how deep into the table it is.
+    """
+    cursor = None
+    while True:
+        page_where = dict(where or {})
+        if cursor:
+            page_where.update(keyset_after(*cursor))
+
+        users = await read_db.user.find_many(
+            where=page_where,
+            order=[{"createdAt": "desc"}, {"id": "desc"}],
+            take=batch_size
+        )
+        if not users:
+            return
+
+        yield users
 
-    # Create CSV
+        if len(users) < batch_size:
+            return
+        cursor = (users[-1].createdAt, users[-1].id)
+
+
+async def stream_users_csv(where: dict | None, compress: bool = False):
+    """Yield the CSV export chunk by chunk, optionally gzip-compressed."""
     output = io.StringIO()
     writer = csv.writer(output)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def flush() -> bytes:
+        data = output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate(0)
+        if compressor:
+            # Sync flush so every page reaches the client immediately
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    output.write('\ufeff')
     writer.writerow(["Email", "姓名", "電話", "標籤", "建立時間"])
+    yield flush()
+
+    async for users in iter_users_keyset(where, get_export_batch_size()):
+        for user in users:
+            writer.writerow([
+                user.email,
+                user.name or "",
+                user.phone or "",
+                ", ".join(user.tags),
+                user.createdAt.strftime("%Y-%m-%d %H:%M:%S") if user.createdAt else ""
+            ])
+        yield flush()
+
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/export/csv")
+async def export_users_csv(
+    tag: str = Query(default=None, description="篩選特定標籤的用戶"),
+    gzip: bool = Query(default=False, description="以 gzip 壓縮匯出檔")
+):
+    """Export users to CSV file, streamed page by page."""
+    # Filter by tag if specified (uses the GIN index on User.tags)
+    where = {"tags": {"has": tag}} if tag else None
 
-    for user in users:
-        tags = parse_tags(user.tags)
-        writer.writerow([
-            user.email,
-            user.name or "",
-            user.phone or "",
-            ", ".join(tags),
-            user.createdAt.strftime("%Y-%m-%d %H:%M:%S") if user.createdAt else ""
-        ])
-
-    output.seek(0)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"users_export_{timestamp}.csv"
-
-    bom = '\ufeff'
-    content = bom + output.getvalue()
+    media_type = "text/csv; charset=utf-8"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
 
     return StreamingResponse(
-        iter([content]),
-        media_type="text/csv; charset=utf-8",
+        stream_users_csv(where, compress=gzip),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1,14 +1,55 @@
+import os
+import time
+import uuid
+import socket
 import asyncio
 import json
-from datetime import datetime
-
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
-
-from app.db import db
-from app.gmail import send_email
-
-scheduler = AsyncIOScheduler(timezone="Asia/Taipei")
+from datetime import datetime, timedelta
+
+from app.db import db, read_db
+from app.gmail import send_email, get_send_concurrency, get_email_transport
+from app.rate_limit import (
+    EmailDeferred,
+    get_rate_limiter,
+    get_daily_limit,
+    get_daily_sends_remaining,
+)
+from app.suppression import (
+    get_unsubscribe_url,
+    is_suppressed,
+    load_suppressed_emails,
+    public_base_url_configured,
+)
+from app.response_cache import SCHEDULED_EMAILS, bump
+from app.events import hub
+from app.metrics import (
+    campaign_recipients_total,
+    campaign_recipients_per_second,
+    email_send_duration,
+    register_gauge_callback,
+)
+from app.config import get_event_name, utcnow
+from app.email_templates import compile_template, get_placeholder_values
+from app.stats import reconcile_counters
+
+# Created (and APScheduler imported) on first use, off the startup path
+_scheduler = None
+
+
+def get_scheduler():
+    """Get the shared APScheduler instance."""
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        _scheduler = AsyncIOScheduler(timezone="Asia/Taipei")
+    return _scheduler
+
+
+register_gauge_callback(
+    "scheduler_jobs",
+    "Jobs currently queued in the scheduler",
+    lambda: len(_scheduler.get_jobs()) if _scheduler else 0
+)
 
 
 def parse_tags(tags_str: str) -> list[str]:
@@ -19,95 +60,650 @@ def parse_tags(tags_str: str) -> list[str]:
         return []
 
 
-async def execute_scheduled_email(scheduled_email_id: str):
-    """Execute a scheduled email task."""
-    print(f"[Scheduler] Executing scheduled email: {scheduled_email_id}")
+def get_email_log_batch_size() -> int:
+    """Get the number of EmailLog rows written per batch."""
+    return int(os.getenv("EMAIL_LOG_BATCH_SIZE", "500"))
 
-    try:
-        task = await db.scheduledemail.find_unique(where={"id": scheduled_email_id})
 
-        if not task:
-            print(f"[Scheduler] Task not found: {scheduled_email_id}")
-            return
+def get_email_log_flush_interval() -> float:
+    """Get the maximum seconds buffered EmailLog rows wait before a flush."""
+    return float(os.getenv("EMAIL_LOG_FLUSH_INTERVAL", "5"))
+
+
+class EmailLogBuffer:
+    """Buffer EmailLog rows and write them with create_many."""
 
-        if task.status != "pending":
-            print(f"[Scheduler] Task already processed: {task.status}")
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows: list[dict] = []
+        self.last_flush = time.monotonic()
+
+    async def add(self, row: dict):
+        """Buffer a row, flushing when the batch is full or stale."""
+        self.rows.append(row)
+        if (
+            len(self.rows) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered rows."""
+        self.last_flush = time.monotonic()
+        if not self.rows:
             return
+        rows, self.rows = self.rows, []
+        await db.emaillog.create_many(data=rows)
+
+
+def publish_campaign_event(task_id: str, status: str, sent: int, failed: int, total: int):
+    """Broadcast campaign progress to live scheduler pages."""
+    hub.publish("campaign", {
+        "id": task_id,
+        "status": status,
+        "sent": sent,
+        "failed": failed,
+        "total": total
+    })
+
+
+def get_campaign_chunk_size() -> int:
+    """Get the number of recipients checkpointed per campaign chunk."""
+    return int(os.getenv("CAMPAIGN_CHUNK_SIZE", "500"))
+
+
+class CampaignProgress:
+    """Running totals for a campaign, published at most once per second."""
+
+    def __init__(self, task_id: str, total: int, sent: int = 0, failed: int = 0):
+        self.task_id = task_id
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        self.last_published = time.monotonic()
+
+    def record(self, success: bool):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        # Throttle live progress updates to one per second
+        if time.monotonic() - self.last_published >= 1:
+            self.publish("sending")
+
+    def publish(self, status: str):
+        self.last_published = time.monotonic()
+        publish_campaign_event(self.task_id, status, self.sent, self.failed, self.total)
+
+
+class CampaignDeferred(Exception):
+    """The email quota stopped a campaign; it should resume at `retry_at`."""
+
+    def __init__(self, retry_at: datetime, reason: str):
+        super().__init__(reason)
+        self.retry_at = retry_at
+
+
+# Settle a chunk's deliveries as sent or failed in one statement
+SETTLE_DELIVERIES_SQL = '''
+UPDATE "CampaignDelivery" AS d
+SET "status" = v."status", "error" = v."error", "updatedAt" = (now() AT TIME ZONE 'utc')
+FROM jsonb_to_recordset($2::jsonb) AS v("userId" text, "status" text, "error" text)
+WHERE d."scheduledEmailId" = $1
+  AND d."userId" = v."userId"
+'''
+
+
+async def settle_deliveries(task_id: str, results: list[tuple[object, bool]], released: list[str]):
+    """
+    Record the outcome of a chunk's sends, and delete the delivery rows of
+    recipients that were not sent so a later run picks them up again.
+    """
+    if results:
+        await db.execute_raw(
+            SETTLE_DELIVERIES_SQL,
+            task_id,
+            json.dumps([
+                {
+                    "userId": user.id,
+                    "status": "sent" if success else "failed",
+                    "error": None if success else "Failed to send"
+                }
+                for user, success in results
+            ])
+        )
+    if released:
+        await db.campaigndelivery.delete_many(
+            where={"scheduledEmailId": task_id, "userId": {"in": released}}
+        )
 
-        # Parse target tags
-        target_tags = parse_tags(task.targetTags)
 
-        # Find users - filter by tags if specified
-        users = await db.user.find_many()
+async def send_to_recipients(task, users: list, progress: CampaignProgress, should_stop=None) -> list[tuple[object, bool]]:
+    """
+    Send a scheduled email to every user through a bounded pool of workers.
+
+    Each recipient must already have a `sending` CampaignDelivery row
+    claimed by this run. Once the batch finishes, or is interrupted by an
+    error, every row is settled as sent or failed in one statement, and the
+    rows of recipients that were never sent are deleted. If `should_stop`
+    returns True, workers stop picking up new recipients.
+
+    A recipient deferred by the email quota stops the remaining workers;
+    the batch then raises CampaignDeferred.
 
-        if target_tags:
-            # Filter users who have ALL target tags
-            filtered_users = []
-            for user in users:
-                user_tags = parse_tags(user.tags)
-                if all(t in user_tags for t in target_tags):
-                    filtered_users.append(user)
-            users = filtered_users
+    EmailLog rows are buffered and written in batches; whatever is still
+    buffered is flushed even if sending is interrupted by an error.
 
-        print(f"[Scheduler] Found {len(users)} users to send email")
+    Returns a (user, success) pair for each recipient.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for user in users:
+        queue.put_nowait(user)
 
-        sent_count = 0
-        failed_count = 0
+    # Parse the template once for the whole campaign
+    template = compile_template(task.htmlContent)
+    event_name = get_event_name()
+
+    results = []
+    released: list[str] = []
+    deferred: list[EmailDeferred] = []
+    log_buffer = EmailLogBuffer(get_email_log_batch_size(), get_email_log_flush_interval())
+
+    async def worker():
+        while not deferred and not (should_stop and should_stop()):
+            try:
+                user = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
 
-        for user in users:
             # Personalize content
-            personalized_content = task.htmlContent.replace(
-                "{{name}}", user.name or "朋友"
-            ).replace(
-                "{{email}}", user.email
+            unsubscribe_url = get_unsubscribe_url(user.email)
+            personalized_content = template.render(
+                get_placeholder_values(user, event_name, unsubscribe_url)
             )
 
-            success = await send_email(
-                to_email=user.email,
-                subject=task.subject,
-                html_content=personalized_content,
-                name=user.name
-            )
+            try:
+                success = await send_email(
+                    to_email=user.email,
+                    subject=task.subject,
+                    html_content=personalized_content,
+                    name=user.name,
+                    unsubscribe_url=unsubscribe_url
+                )
+            except EmailDeferred as e:
+                # Not sent: release the recipient for the next run
+                deferred.append(e)
+                released.append(user.id)
+                continue
+
+            results.append((user, success))
+            campaign_recipients_total.inc(("sent" if success else "failed",))
+            progress.record(success)
 
             # Log the email
-            await db.emaillog.create(
-                data={
-                    "userId": user.id,
-                    "emailType": "scheduled_notification",
-                    "subject": task.subject,
-                    "status": "sent" if success else "failed",
-                    "error": None if success else "Failed to send"
-                }
-            )
+            await log_buffer.add({
+                "userId": user.id,
+                "emailType": "scheduled_notification",
+                "subject": task.subject,
+                "status": "sent" if success else "failed",
+                "error": None if success else "Failed to send"
+            })
 
-            if success:
-                sent_count += 1
-            else:
-                failed_count += 1
+    try:
+        worker_count = min(get_send_concurrency(), len(users))
+        await asyncio.gather(*(worker() for _ in range(worker_count)))
+    finally:
+        await log_buffer.flush()
+        # Recipients never picked up (stopped early) were not attempted either
+        while not queue.empty():
+            released.append(queue.get_nowait().id)
+        await settle_deliveries(task.id, results, released)
+
+    if deferred:
+        latest = max(deferred, key=lambda e: e.retry_at)
+        raise CampaignDeferred(latest.retry_at, latest.reason)
+
+    return results
+
+
+# Claim a chunk's recipients for a campaign. Only rows this statement
+# inserted are returned, so two runs that read the same chunk can never
+# both send to the same user.
+CLAIM_DELIVERIES_SQL = '''
+INSERT INTO "CampaignDelivery" ("id", "scheduledEmailId", "userId", "status", "updatedAt")
+SELECT gen_random_uuid()::text, $1, user_id, 'sending', (now() AT TIME ZONE 'utc')
+FROM jsonb_array_elements_text($2::jsonb) AS user_id
+ON CONFLICT ("scheduledEmailId", "userId") DO NOTHING
+RETURNING "userId"
+'''
+
+
+async def claim_deliveries(task_id: str, users: list) -> list:
+    """Claim delivery rows for these users; return the users this run now owns."""
+    if not users:
+        return []
+    rows = await db.query_raw(
+        CLAIM_DELIVERIES_SQL,
+        task_id,
+        json.dumps([user.id for user in users])
+    )
+    claimed = {row["userId"] for row in rows}
+    return [user for user in users if user.id in claimed]
+
+
+async def iter_recipient_chunks(where: dict | None, chunk_size: int):
+    """Yield campaign recipients in id order, one keyset page at a time."""
+    last_id = None
+    while True:
+        page_where = where
+        if last_id is not None:
+            id_filter = {"id": {"gt": last_id}}
+            page_where = {"AND": [where, id_filter]} if where else id_filter
+
+        users = await read_db.user.find_many(
+            where=page_where,
+            order={"id": "asc"},
+            take=chunk_size
+        )
+        if not users:
+            return
+        yield users
+        if len(users) < chunk_size:
+            return
+        last_id = users[-1].id
+
+
+# Count tag-matching users, and how many of them are suppressed (anti-join
+# on the Suppression primary key)
+COUNT_CAMPAIGN_RECIPIENTS_SQL = '''
+SELECT
+    COUNT(*) FILTER (WHERE s."email" IS NULL) AS "count",
+    COUNT(*) FILTER (WHERE s."email" IS NOT NULL) AS "suppressed"
+FROM "User" u
+LEFT JOIN "Suppression" s ON s."email" = lower(u."email")
+WHERE u."tags" @> ARRAY(SELECT jsonb_array_elements_text($1::jsonb))
+'''
+
+
+async def get_recipient_counts(target_tags: list[str]) -> dict:
+    """Count reachable and suppressed users for these target tags in SQL."""
+    rows = await read_db.query_raw(
+        COUNT_CAMPAIGN_RECIPIENTS_SQL,
+        json.dumps(target_tags, ensure_ascii=False)
+    )
+    return {"count": int(rows[0]["count"]), "suppressed": int(rows[0]["suppressed"])}
+
+
+async def count_campaign_recipients(target_tags: list[str]) -> int:
+    """Count the users a campaign with these target tags would reach."""
+    return (await get_recipient_counts(target_tags))["count"]
+
+
+# One page of reachable recipients in id order, for previews
+RECIPIENT_PAGE_SQL = '''
+SELECT u."id", u."email", u."name" FROM "User" u
+WHERE u."tags" @> ARRAY(SELECT jsonb_array_elements_text($1::jsonb))
+  AND ($2::text IS NULL OR u."id" > $2)
+  AND NOT EXISTS (
+      SELECT 1 FROM "Suppression" s WHERE s."email" = lower(u."email")
+  )
+ORDER BY u."id"
+LIMIT $3
+'''
+
+
+async def get_recipient_page(target_tags: list[str], cursor: str | None, limit: int) -> list[dict]:
+    """Get up to `limit` reachable recipients after the `cursor` user id."""
+    return await read_db.query_raw(
+        RECIPIENT_PAGE_SQL,
+        json.dumps(target_tags, ensure_ascii=False),
+        cursor,
+        limit
+    )
 
-        # Update task status
-        await db.scheduledemail.update(
-            where={"id": scheduled_email_id},
-            data={
-                "status": "sent",
-                "sentAt": datetime.now(),
-                "sentCount": sent_count,
-                "failedCount": failed_count
-            }
+
+async def estimate_send_duration(recipients: int) -> dict:
+    """
+    Estimate how long a campaign to `recipients` users takes to send.
+
+    Uses the rate limiter's current rate; when sending is unthrottled it
+    falls back to the send pool size over the average observed send
+    latency. A daily limit spreads larger campaigns over several days,
+    counting only what is left of today's budget for the first day.
+    """
+    limiter_rate = get_rate_limiter().rate
+    mean_latency = email_send_duration.mean((get_email_transport(),))
+    concurrency_rate = get_send_concurrency() / mean_latency if mean_latency else None
+
+    if limiter_rate > 0 and (concurrency_rate is None or limiter_rate <= concurrency_rate):
+        rate, limited_by = limiter_rate, "rate_limit"
+    elif concurrency_rate is not None:
+        rate, limited_by = concurrency_rate, "concurrency"
+    else:
+        rate, limited_by = None, None
+
+    daily_limit = get_daily_limit()
+    remaining_today = await get_daily_sends_remaining()
+    days = 1
+    if remaining_today is not None and recipients > remaining_today:
+        days = 1 + -(-(recipients - remaining_today) // daily_limit)
+        limited_by = "daily_limit"
+
+    return {
+        "rate_per_second": round(rate, 2) if rate else None,
+        "seconds": round(recipients / rate, 1) if rate else None,
+        "days": days,
+        "daily_remaining": remaining_today,
+        "limited_by": limited_by
+    }
+
+
+async def count_deliveries(scheduled_email_id: str) -> tuple[int, int]:
+    """Count recipients already marked sent and failed for a campaign."""
+    sent = await db.campaigndelivery.count(
+        where={"scheduledEmailId": scheduled_email_id, "status": "sent"}
+    )
+    failed = await db.campaigndelivery.count(
+        where={"scheduledEmailId": scheduled_email_id, "status": "failed"}
+    )
+    return sent, failed
+
+
+def get_campaign_lease_seconds() -> int:
+    """Get how long a claimed campaign stays leased without renewal."""
+    return int(os.getenv("CAMPAIGN_LEASE_SECONDS", "120"))
+
+
+# Identifies this process as the owner of claimed campaigns
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def claim_campaign(scheduled_email_id: str) -> bool:
+    """
+    Atomically claim a due campaign for this worker.
+
+    Succeeds only for a pending campaign whose time has come, or for one
+    whose previous owner let its lease expire, so exactly one worker runs
+    each campaign even when every worker's scheduler fires the same job.
+    """
+    now = utcnow()
+    claimed = await db.scheduledemail.update_many(
+        where={
+            "id": scheduled_email_id,
+            "scheduledAt": {"lte": now},
+            "OR": [
+                {"status": "pending"},
+                {"status": "sending", "leaseExpiresAt": {"lt": now}},
+            ]
+        },
+        data={
+            "status": "sending",
+            "leaseOwner": WORKER_ID,
+            "leaseExpiresAt": now + timedelta(seconds=get_campaign_lease_seconds())
+        }
+    )
+    if claimed:
+        bump(SCHEDULED_EMAILS)
+    return claimed > 0
+
+
+class CampaignLease:
+    """
+    Keeps a claimed campaign's lease alive while it is being sent.
+
+    A failed renewal (database blip, pool timeout) is logged and retried
+    until the lease would expire; past that point another worker may claim
+    the campaign, so the lease is treated as lost and sending stops.
+    """
+
+    def __init__(self, scheduled_email_id: str):
+        self.scheduled_email_id = scheduled_email_id
+        self.lost = False
+        self._task: asyncio.Task | None = None
+        self._expires_at = 0.0
+
+    async def _renew(self) -> bool:
+        renewed = await db.scheduledemail.update_many(
+            where={"id": self.scheduled_email_id, "leaseOwner": WORKER_ID},
+            data={"leaseExpiresAt": utcnow() + timedelta(seconds=get_campaign_lease_seconds())}
+        )
+        return renewed > 0
+
+    async def _renew_forever(self):
+        interval = get_campaign_lease_seconds() / 3
+        retry_interval = min(interval, 5)
+        delay = interval
+        while True:
+            await asyncio.sleep(max(0, min(delay, self._expires_at - time.monotonic())))
+            remaining = self._expires_at - time.monotonic()
+            if remaining <= 0:
+                print(f"[Scheduler] Lease expired before it could be renewed: {self.scheduled_email_id}")
+                self.lost = True
+                return
+
+            # Measured before the update, so the local expiry errs early
+            attempted_at = time.monotonic()
+            try:
+                renewed = await asyncio.wait_for(self._renew(), timeout=remaining)
+            except Exception as e:
+                print(f"[Scheduler] Lease renewal failed for task {self.scheduled_email_id}, retrying: {e!r}")
+                delay = retry_interval
+                continue
+
+            if not renewed:
+                print(f"[Scheduler] Lost lease on task: {self.scheduled_email_id}")
+                self.lost = True
+                return
+            self._expires_at = attempted_at + get_campaign_lease_seconds()
+            delay = interval
+
+    def start(self):
+        # Called right after claim_campaign, which set the lease
+        self._expires_at = time.monotonic() + get_campaign_lease_seconds()
+        self._task = asyncio.create_task(self._renew_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+async def release_campaign(scheduled_email_id: str, data: dict) -> bool:
+    """Write the final campaign state, provided this worker still owns it."""
+    data = {**data, "leaseOwner": None, "leaseExpiresAt": None}
+    updated = await db.scheduledemail.update_many(
+        where={"id": scheduled_email_id, "leaseOwner": WORKER_ID},
+        data=data
+    )
+    bump(SCHEDULED_EMAILS)
+    return updated > 0
+
+
+async def execute_scheduled_email(scheduled_email_id: str):
+    """
+    Execute a scheduled email task, if this worker can claim it.
+
+    Recipients are processed in chunks. Before a chunk is sent, a `sending`
+    CampaignDelivery row is claimed for each recipient, and the chunk's rows
+    are settled once it finishes, so a campaign resumed after a crash or a
+    lost lease skips everyone already handled. Recipients still `sending`
+    when the previous run died are marked failed rather than retried: a
+    duplicate email is worse than a missing one.
+    """
+    if not await claim_campaign(scheduled_email_id):
+        print(f"[Scheduler] Task not claimable (not due, processed or owned elsewhere): {scheduled_email_id}")
+        return
+
+    print(f"[Scheduler] Executing scheduled email: {scheduled_email_id} on {WORKER_ID}")
+    lease = CampaignLease(scheduled_email_id)
+    lease.start()
+    progress = CampaignProgress(scheduled_email_id, 0)
+
+    try:
+        task = await db.scheduledemail.find_unique(where={"id": scheduled_email_id})
+
+        # Real mail must not carry unsubscribe links to localhost; the
+        # campaign fails and can be resumed once the setting is fixed
+        if get_email_transport() == "gmail" and not public_base_url_configured():
+            raise RuntimeError("PUBLIC_BASE_URL is not set, refusing to send unsubscribe links to localhost")
+
+        # Settle deliveries left in flight by an interrupted run
+        interrupted = await db.campaigndelivery.update_many(
+            where={"scheduledEmailId": scheduled_email_id, "status": "sending"},
+            data={"status": "failed", "error": "Interrupted before delivery was confirmed"}
         )
+        if interrupted:
+            print(f"[Scheduler] Marked {interrupted} interrupted deliveries as failed")
+
+        # Parse target tags
+        target_tags = parse_tags(task.targetTags)
+
+        # Find users who have ALL target tags (filtered in the database),
+        # minus suppressed addresses (one set lookup per recipient)
+        where = {"tags": {"hasEvery": target_tags}} if target_tags else None
+        suppressed = await load_suppressed_emails()
+        total = await count_campaign_recipients(target_tags)
+        sent_before, failed_before = await count_deliveries(scheduled_email_id)
+        progress = CampaignProgress(scheduled_email_id, total, sent_before, failed_before)
+
+        if sent_before or failed_before:
+            print(f"[Scheduler] Resuming task after {sent_before + failed_before} of {total} recipients")
+        else:
+            print(f"[Scheduler] Found {total} users to send email")
+        progress.publish("sending")
+
+        started_at = time.monotonic()
+        processed = 0
+        async for users in iter_recipient_chunks(where, get_campaign_chunk_size()):
+            if lease.lost:
+                break
+
+            # Skip recipients a previous (or concurrent) run already claimed
+            remaining = await claim_deliveries(
+                scheduled_email_id,
+                [user for user in users if not is_suppressed(user, suppressed)]
+            )
+            if not remaining:
+                continue
+
+            results = await send_to_recipients(task, remaining, progress, should_stop=lambda: lease.lost)
+            processed += len(results)
+
+            # Checkpoint running totals on the task itself
+            await db.scheduledemail.update_many(
+                where={"id": scheduled_email_id, "leaseOwner": WORKER_ID},
+                data={"sentCount": progress.sent, "failedCount": progress.failed}
+            )
+            bump(SCHEDULED_EMAILS)
+
+        elapsed = time.monotonic() - started_at
+        if elapsed > 0:
+            campaign_recipients_per_second.set(processed / elapsed)
 
+        if lease.lost:
+            print(f"[Scheduler] Stopped task after losing its lease: {scheduled_email_id}")
+            return
+
+        sent_count, failed_count = await count_deliveries(scheduled_email_id)
+
+        # Update task status
+        await release_campaign(scheduled_email_id, {
+            "status": "sent",
+            "sentAt": utcnow(),
+            "sentCount": sent_count,
+            "failedCount": failed_count
+        })
+
+        progress.sent, progress.failed = sent_count, failed_count
+        progress.publish("sent")
         print(f"[Scheduler] Email task completed: {sent_count} sent, {failed_count} failed")
 
+    except CampaignDeferred as e:
+        # Hand the campaign back as pending; it resumes once quota allows
+        print(f"[Scheduler] Task deferred until {e.retry_at}: {e}")
+        await release_campaign(scheduled_email_id, {
+            "status": "pending",
+            "scheduledAt": e.retry_at,
+            "sentCount": progress.sent,
+            "failedCount": progress.failed
+        })
+        schedule_email_task(scheduled_email_id, e.retry_at)
+        progress.publish("pending")
+
     except Exception as e:
         print(f"[Scheduler] Error executing task: {e}")
-        await db.scheduledemail.update(
-            where={"id": scheduled_email_id},
-            data={"status": "failed", "failedCount": -1}
-        )
+        await release_campaign(scheduled_email_id, {
+            "status": "failed",
+            "sentCount": progress.sent,
+            "failedCount": progress.failed
+        })
+        progress.publish("failed")
+
+    finally:
+        await lease.stop()
+
+
+async def resume_campaign(scheduled_email_id: str) -> bool:
+    """
+    Put a failed campaign back in the queue and run it now.
+
+    Recipients already recorded as sent or failed are skipped.
+    """
+    reset = await db.scheduledemail.update_many(
+        where={"id": scheduled_email_id, "status": "failed"},
+        data={"status": "pending"}
+    )
+    if reset == 0:
+        return False
+    bump(SCHEDULED_EMAILS)
+    asyncio.create_task(execute_scheduled_email(scheduled_email_id))
+    return True
+
+
+async def dispatch_due_campaigns():
+    """
+    Pick up campaigns that no local job will run: ones created on another
+    worker, missed while every worker was down, or abandoned by a worker
+    whose lease expired.
+    """
+    now = utcnow()
+    due = await db.scheduledemail.find_many(
+        where={
+            "scheduledAt": {"lte": now},
+            "OR": [
+                {"status": "pending"},
+                {"status": "sending", "leaseExpiresAt": {"lt": now}},
+            ]
+        }
+    )
+    for task in due:
+        asyncio.create_task(execute_scheduled_email(task.id))
+
+
+def schedule_campaign_dispatch():
+    """Poll for due or abandoned campaigns on every worker."""
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    seconds = int(os.getenv("CAMPAIGN_POLL_SECONDS", "60"))
+    get_scheduler().add_job(
+        dispatch_due_campaigns,
+        trigger=IntervalTrigger(seconds=seconds),
+        id="dispatch_due_campaigns",
+        name="Dispatch due campaigns",
+        replace_existing=True
+    )
+    print(f"[Scheduler] Polling for due campaigns every {seconds} seconds")
 
 
 def schedule_email_task(task_id: str, scheduled_time: datetime):
     """Add a new email task to the scheduler."""
+    from apscheduler.triggers.date import DateTrigger
+
+    scheduler = get_scheduler()
     job_id = f"email_{task_id}"
 
     existing_job = scheduler.get_job(job_id)
@@ -129,7 +725,7 @@ def cancel_email_task(task_id: str):
     """Cancel a scheduled email task."""
     job_id = f"email_{task_id}"
     try:
-        scheduler.remove_job(job_id)
+        get_scheduler().remove_job(job_id)
         print(f"[Scheduler] Cancelled email task: {task_id}")
         return True
     except Exception as e:
@@ -152,8 +748,24 @@ async def restore_pending_tasks():
     print(f"[Scheduler] Restored {len(pending_tasks)} pending tasks")
 
 
+def schedule_counter_reconciliation():
+    """Periodically correct drift in the stats counters."""
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    minutes = int(os.getenv("COUNTER_RECONCILE_MINUTES", "15"))
+    get_scheduler().add_job(
+        reconcile_counters,
+        trigger=IntervalTrigger(minutes=minutes),
+        id="reconcile_counters",
+        name="Reconcile stats counters",
+        replace_existing=True
+    )
+    print(f"[Scheduler] Counter reconciliation every {minutes} minutes")
+
+
 def start_scheduler():
     """Start the scheduler."""
+    scheduler = get_scheduler()
     if not scheduler.running:
         scheduler.start()
         print("[Scheduler] Started")
@@ -161,6 +773,6 @@ def start_scheduler():
 
 def shutdown_scheduler():
     """Shutdown the scheduler."""
-    if scheduler.running:
-        scheduler.shutdown()
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown()
         print("[Scheduler] Shutdown")
@@ -2,12 +2,20 @@ import json
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 
-from app.db import db
-from app.scheduler import schedule_email_task, cancel_email_task
+from app.db import db, read_db
+from app.scheduler import (
+    schedule_email_task,
+    cancel_email_task,
+    resume_campaign,
+    get_recipient_counts,
+    get_recipient_page,
+    estimate_send_duration,
+)
 from app.email_templates import get_template, get_all_templates, TEMPLATES
+from app.response_cache import SCHEDULED_EMAILS, bump, cached_response
 
 router = APIRouter(prefix="/scheduler", tags=["scheduler"])
 
@@ -42,27 +50,29 @@ class UpdateScheduledEmailRequest(BaseModel):
 
 
 @router.get("/emails")
-async def list_scheduled_emails():
-    """List all scheduled emails."""
-    emails = await db.scheduledemail.find_many(order={"scheduledAt": "desc"})
-
-    # Parse tags for response
-    result = []
-    for email in emails:
-        result.append({
-            "id": email.id,
-            "name": email.name,
-            "subject": email.subject,
-            "targetTags": parse_tags(email.targetTags),
-            "scheduledAt": email.scheduledAt,
-            "sentAt": email.sentAt,
-            "status": email.status,
-            "sentCount": email.sentCount,
-            "failedCount": email.failedCount,
-            "createdAt": email.createdAt
-        })
-
-    return result
+async def list_scheduled_emails(request: Request):
+    """List all scheduled emails (cached until a scheduled email changes)."""
+    async def render():
+        emails = await db.scheduledemail.find_many(order={"scheduledAt": "desc"})
+
+        # Parse tags for response
+        result = []
+        for email in emails:
+            result.append({
+                "id": email.id,
+                "name": email.name,
+                "subject": email.subject,
+                "targetTags": parse_tags(email.targetTags),
+                "scheduledAt": email.scheduledAt,
+                "sentAt": email.sentAt,
+                "status": email.status,
+                "sentCount": email.sentCount,
+                "failedCount": email.failedCount,
+                "createdAt": email.createdAt
+            })
+        return result
+
+    return await cached_response(request, "scheduled_emails", (SCHEDULED_EMAILS,), render)
 
 
 @router.get("/emails/{email_id}")
@@ -101,6 +111,7 @@ async def create_scheduled_email(request: CreateScheduledEmailRequest):
     )
 
     schedule_email_task(email.id, request.scheduled_at)
+    bump(SCHEDULED_EMAILS)
 
     return {
         "id": email.id,
@@ -136,12 +147,19 @@ async def update_scheduled_email(email_id: str, request: UpdateScheduledEmailReq
             raise HTTPException(status_code=400, detail="Scheduled time must be in the future")
         update_data["scheduledAt"] = request.scheduled_at
 
-    email = await db.scheduledemail.update(where={"id": email_id}, data=update_data)
+    # Only update while still pending, so an edit cannot race a worker claiming it
+    updated = await db.scheduledemail.update_many(
+        where={"id": email_id, "status": "pending"},
+        data=update_data
+    )
+    if updated == 0:
+        raise HTTPException(status_code=400, detail="Cannot update a processed email")
+    bump(SCHEDULED_EMAILS)
 
     if request.scheduled_at is not None:
-        schedule_email_task(email.id, request.scheduled_at)
+        schedule_email_task(email_id, request.scheduled_at)
 
-    return {"message": "Updated", "id": email.id}
+    return {"message": "Updated", "id": email_id}
 
 
 @router.delete("/emails/{email_id}")
@@ -154,74 +172,98 @@ async def cancel_scheduled_email(email_id: str):
     if existing.status != "pending":
         raise HTTPException(status_code=400, detail="Cannot cancel a processed email")
 
-    cancel_email_task(email_id)
-
-    await db.scheduledemail.update(
-        where={"id": email_id},
+    cancelled = await db.scheduledemail.update_many(
+        where={"id": email_id, "status": "pending"},
         data={"status": "cancelled"}
     )
+    if cancelled == 0:
+        raise HTTPException(status_code=400, detail="Cannot cancel a processed email")
+    bump(SCHEDULED_EMAILS)
+
+    cancel_email_task(email_id)
 
     return {"message": "Cancelled"}
 
 
+@router.post("/emails/{email_id}/resume")
+async def resume_scheduled_email(email_id: str):
+    """Resume a failed scheduled email, skipping recipients already handled."""
+    existing = await db.scheduledemail.find_unique(where={"id": email_id})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Scheduled email not found")
+
+    if not await resume_campaign(email_id):
+        raise HTTPException(status_code=400, detail="Only failed emails can be resumed")
+
+    return {"message": "Resumed"}
+
+
 # ===== Templates API =====
 
 @router.get("/templates")
-async def list_templates():
+async def list_templates(request: Request):
     """List all available email templates."""
-    return get_all_templates()
+    async def render():
+        return get_all_templates()
+
+    return await cached_response(request, "templates", (), render)
 
 
 @router.get("/templates/{template_id}")
-async def get_template_by_id(template_id: str):
+async def get_template_by_id(request: Request, template_id: str):
     """Get a specific email template."""
     template = get_template(template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    return {
-        "id": template_id,
-        "name": template["name"],
-        "subject": template["subject"],
-        "html_content": template["html"]
-    }
+    async def render():
+        return {
+            "id": template_id,
+            "name": template["name"],
+            "subject": template["subject"],
+            "html_content": template["html"]
+        }
+
+    return await cached_response(request, f"template:{template_id}", (), render)
 
 
 # ===== Recipients Preview =====
 
 @router.get("/preview-recipients")
-async def preview_recipients(tags: str = ""):
-    """Preview users that would receive an email based on tags."""
+async def preview_recipients(
+    tags: str = "",
+    count_only: bool = Query(default=False, description="只回傳人數與預估寄送時間"),
+    limit: int = Query(default=50, ge=1, le=500, description="每頁收件人數"),
+    cursor: str | None = Query(default=None, description="上一頁回傳的 next_cursor")
+):
+    """
+    Preview who would receive an email based on tags.
+
+    Counts and the send-time estimate are computed in the database; the
+    recipient sample is paged by user id, so the response stays small at
+    any audience size. Counts are computed for the first page and for
+    count_only requests, not for later pages.
+    """
     tag_list = [t.strip() for t in tags.split(",") if t.strip()]
 
-    users = await db.user.find_many()
-
-    if tag_list:
-        filtered = []
-        for user in users:
-            user_tags = parse_tags(user.tags)
-            if all(t in user_tags for t in tag_list):
-                filtered.append({
-                    "id": user.id,
-                    "email": user.email,
-                    "name": user.name,
-                    "tags": user_tags
-                })
-        return {"count": len(filtered), "users": filtered}
-    else:
-        result = [{
-            "id": u.id,
-            "email": u.email,
-            "name": u.name,
-            "tags": parse_tags(u.tags)
-        } for u in users]
-        return {"count": len(result), "users": result}
+    result = {}
+    if cursor is None or count_only:
+        counts = await get_recipient_counts(tag_list)
+        result.update(counts)
+        result["estimate"] = await estimate_send_duration(counts["count"])
+    if count_only:
+        return result
+
+    users = await get_recipient_page(tag_list, cursor, limit)
+    result["users"] = users
+    result["next_cursor"] = users[-1]["id"] if len(users) == limit else None
+    return result
 
 
 @router.get("/logs")
 async def get_email_logs(limit: int = 100):
     """Get recent email logs."""
-    logs = await db.emaillog.find_many(
+    logs = await read_db.emaillog.find_many(
         take=limit,
         order={"sentAt": "desc"},
         include={"user": True}
@@ -0,0 +1,111 @@
+"""
+Schema fingerprints that let restarts skip `prisma generate` and `db push`.
+
+Used by start.sh and render-build.sh:
+
+    python -m app.schema_state client-current   # exit 0 if the generated client matches
+    python -m app.schema_state mark-client      # record that the client was generated
+    python -m app.schema_state db-current       # exit 0 if the database matches
+    python -m app.schema_state mark-db          # record that the schema was pushed
+"""
+import sys
+import asyncio
+import hashlib
+from pathlib import Path
+
+PRISMA_DIR = Path(__file__).resolve().parent.parent / "prisma"
+SCHEMA_STATE_KEY = "schema"
+
+
+def schema_hash() -> str:
+    """Fingerprint of schema.prisma plus the SQL migrations run around a push."""
+    digest = hashlib.sha256()
+    for path in [
+        PRISMA_DIR / "schema.prisma",
+        *sorted((PRISMA_DIR / "sql").glob("*.sql")),
+        *sorted((PRISMA_DIR / "sql" / "post-push").glob("*.sql")),
+    ]:
+        digest.update(path.relative_to(PRISMA_DIR).as_posix().encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def client_stamp_path() -> Path | None:
+    """
+    Stamp file inside the installed prisma package, next to the generated
+    client, so reinstalling the package also discards the stamp.
+    """
+    try:
+        import prisma
+    except ImportError:
+        return None
+    # Without the package installed, ./prisma imports as a namespace package
+    if getattr(prisma, "__file__", None) is None:
+        return None
+    return Path(prisma.__file__).resolve().parent / ".schema-hash"
+
+
+def client_is_current() -> bool:
+    stamp = client_stamp_path()
+    return stamp is not None and stamp.is_file() and stamp.read_text().strip() == schema_hash()
+
+
+def mark_client():
+    stamp = client_stamp_path()
+    if stamp is not None:
+        stamp.write_text(schema_hash())
+
+
+async def db_is_current() -> bool:
+    from prisma import Prisma
+
+    client = Prisma()
+    try:
+        await client.connect()
+        state = await client.schemastate.find_unique(where={"key": SCHEMA_STATE_KEY})
+        return state is not None and state.hash == schema_hash()
+    except Exception as e:
+        # Missing table, stale client, unreachable database: push to be safe
+        print(f"[Schema] Cannot confirm database schema: {e}")
+        return False
+    finally:
+        if client.is_connected():
+            await client.disconnect()
+
+
+async def mark_db():
+    from prisma import Prisma
+
+    client = Prisma()
+    await client.connect()
+    try:
+        current = schema_hash()
+        await client.schemastate.upsert(
+            where={"key": SCHEMA_STATE_KEY},
+            data={
+                "create": {"key": SCHEMA_STATE_KEY, "hash": current},
+                "update": {"hash": current}
+            }
+        )
+    finally:
+        await client.disconnect()
+
+
+def main(argv: list[str]) -> int:
+    command = argv[1] if len(argv) > 1 else ""
+    if command == "client-current":
+        return 0 if client_is_current() else 1
+    if command == "mark-client":
+        mark_client()
+        return 0
+    if command == "db-current":
+        return 0 if asyncio.run(db_is_current()) else 1
+    if command == "mark-db":
+        asyncio.run(mark_db())
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 
 
 class CheckInRequest(BaseModel):
@@ -21,3 +21,34 @@ class UserResponse(BaseModel):
     name: str | None
     phone: str | None
     tags: list[str]
+
+
+class BatchCheckInItem(CheckInRequest):
+    idempotency_key: str = Field(min_length=1, max_length=128)
+
+
+class BatchCheckInRequest(BaseModel):
+    # Items are validated one by one as BatchCheckInItem by the route, so a
+    # malformed item is rejected on its own instead of failing the batch
+    items: list[dict] = Field(min_length=1, max_length=200)
+
+
+class BatchCheckInItemResult(BaseModel):
+    idempotency_key: str | None
+    success: bool
+    message: str
+    is_new_user: bool
+    email_sent: bool
+    replayed: bool
+    invalid: bool = False
+
+
+class BatchCheckInResponse(BaseModel):
+    results: list[BatchCheckInItemResult]
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """Flatten a pydantic error into one readable line."""
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
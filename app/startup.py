@@ -0,0 +1,53 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+
+class StartupReport:
+    """
+    Timings of the lifespan phases, served by the readiness endpoint.
+
+    Critical phases run before the app accepts requests; background phases
+    (scheduler, outbox, Gmail warm-up) run after, so a restart only keeps
+    the kiosk down for the critical ones.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.phases: list[dict] = []
+        self.ready = False
+        self.background_task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def phase(self, name: str, critical: bool = True):
+        """Time one startup phase and record its outcome."""
+        entry = {"name": name, "critical": critical, "status": "running", "seconds": None}
+        self.phases.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+            raise
+        else:
+            entry["status"] = "done"
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+            print(f"[Startup] {name}: {entry['status']} in {entry['seconds']}s")
+
+    @property
+    def background_done(self) -> bool:
+        return self.background_task is not None and self.background_task.done()
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "background_done": self.background_done,
+            "started_at": self.started_at,
+            "phases": [dict(phase) for phase in self.phases]
+        }
+
+
+startup_report = StartupReport()
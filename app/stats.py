@@ -0,0 +1,84 @@
+import json
+from datetime import timedelta
+
+from app.db import db
+
+TOTAL_USERS = "total_users"
+TOTAL_CHECKINS = "total_checkins"
+
+
+def event_checkins_key(event_name: str) -> str:
+    """Counter key for check-ins at a specific event."""
+    return f"event_checkins:{event_name}"
+
+
+# Recount every counter from the source tables and read the stored value
+# alongside it. Run in a REPEATABLE READ snapshot, so the counts and the
+# stored values reflect exactly the same committed check-ins
+RECONCILE_SNAPSHOT_SQL = '''
+WITH counted AS (
+    SELECT 'total_users' AS "key", COUNT(*) AS "value" FROM "User"
+    UNION ALL
+    SELECT 'total_checkins', COUNT(*) FROM "EventLog"
+    UNION ALL
+    SELECT 'event_checkins:' || "eventName", COUNT(*) FROM "EventLog" GROUP BY "eventName"
+)
+SELECT counted."key", counted."value" AS "counted", COALESCE(c."value", 0) AS "stored"
+FROM counted
+LEFT JOIN "Counter" c ON c."key" = counted."key"
+'''
+
+# Add the drift measured in the snapshot to the current value, keeping any
+# increments committed since. Rows are listed in the order the check-in
+# statement locks them, so the two cannot deadlock
+APPLY_COUNTER_DRIFT_SQL = '''
+INSERT INTO "Counter" ("key", "value")
+SELECT d."key", d."drift"
+FROM ROWS FROM (jsonb_to_recordset($1::jsonb) AS ("key" text, "drift" int))
+    WITH ORDINALITY AS d("key", "drift", "ord")
+ORDER BY d."ord"
+ON CONFLICT ("key") DO UPDATE SET "value" = "Counter"."value" + EXCLUDED."value"
+'''
+
+
+def _lock_order(key: str) -> tuple:
+    return (key != TOTAL_USERS, key != TOTAL_CHECKINS, key)
+
+
+async def get_counters(event_name: str) -> dict:
+    """Read the materialized stats counters."""
+    event_key = event_checkins_key(event_name)
+    counters = await db.counter.find_many(
+        where={"key": {"in": [TOTAL_USERS, TOTAL_CHECKINS, event_key]}}
+    )
+    values = {c.key: c.value for c in counters}
+
+    return {
+        "total_users": values.get(TOTAL_USERS, 0),
+        "total_checkins": values.get(TOTAL_CHECKINS, 0),
+        "event_checkins": values.get(event_key, 0)
+    }
+
+
+async def reconcile_counters():
+    """
+    Correct any drift between the counters and the underlying tables.
+
+    Takes no locks, so check-ins carry on while the counts run; the drift
+    is applied as an increment rather than an overwrite.
+    """
+    try:
+        async with db.tx(timeout=timedelta(seconds=60)) as tx:
+            await tx.execute_raw("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            rows = await tx.query_raw(RECONCILE_SNAPSHOT_SQL)
+
+        drift = [
+            {"key": row["key"], "drift": row["counted"] - row["stored"]}
+            for row in sorted(rows, key=lambda row: _lock_order(row["key"]))
+            if row["counted"] != row["stored"]
+        ]
+        if drift:
+            await db.execute_raw(APPLY_COUNTER_DRIFT_SQL, json.dumps(drift))
+        print(f"[Stats] Counters reconciled ({len(drift)} corrected)")
+    except Exception as e:
+        print(f"[Stats] Failed to reconcile counters: {e}")
@@ -0,0 +1,159 @@
+import os
+import hmac
+import base64
+import hashlib
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, EmailStr
+
+from app.db import db
+
+router = APIRouter(prefix="/suppressions", tags=["suppressions"])
+
+SUPPRESSION_REASONS = ("unsubscribe", "bounce", "complaint", "manual")
+
+
+def normalize_email(email: str) -> str:
+    """Suppressions are matched case-insensitively."""
+    return email.strip().lower()
+
+
+# ===== Signed unsubscribe tokens =====
+
+def get_unsubscribe_secret() -> bytes:
+    """
+    Get the key that signs unsubscribe links.
+
+    Falls back to a key derived from DATABASE_URL so links work across
+    workers without extra setup; set UNSUBSCRIBE_SECRET in production.
+    """
+    secret = os.getenv("UNSUBSCRIBE_SECRET")
+    if not secret:
+        secret = "unsubscribe:" + os.getenv("DATABASE_URL", "")
+    return hashlib.sha256(secret.encode("utf-8")).digest()
+
+
+def get_public_base_url() -> str:
+    """Get the externally reachable base URL used in email links."""
+    return os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
+
+
+def public_base_url_configured() -> bool:
+    """Whether email links point at a configured host rather than localhost."""
+    return bool(os.getenv("PUBLIC_BASE_URL"))
+
+
+def warn_unsubscribe_config():
+    """Log unsubscribe settings that production deployments must set."""
+    if not os.getenv("UNSUBSCRIBE_SECRET"):
+        print("[Suppression] WARNING: UNSUBSCRIBE_SECRET is not set; "
+              "unsubscribe links are signed with a key derived from DATABASE_URL")
+    if not public_base_url_configured():
+        print("[Suppression] WARNING: PUBLIC_BASE_URL is not set; "
+              "campaigns will not be sent through Gmail until it is")
+
+
+def sign_email(email: str) -> str:
+    signature = hmac.new(get_unsubscribe_secret(), email.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(signature[:16]).decode("ascii").rstrip("=")
+
+
+def make_unsubscribe_token(email: str) -> str:
+    """Create a token that lets the holder unsubscribe exactly this address."""
+    email = normalize_email(email)
+    payload = base64.urlsafe_b64encode(email.encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{payload}.{sign_email(email)}"
+
+
+def verify_unsubscribe_token(token: str) -> str | None:
+    """Return the address a token was issued for, or None if it is invalid."""
+    try:
+        payload, signature = token.split(".", 1)
+        email = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+    if not hmac.compare_digest(signature, sign_email(email)):
+        return None
+    return email
+
+
+def get_unsubscribe_url(email: str) -> str:
+    """Build the signed unsubscribe link for a recipient."""
+    query = urlencode({"token": make_unsubscribe_token(email)})
+    return f"{get_public_base_url()}/unsubscribe?{query}"
+
+
+# ===== Suppression list =====
+
+async def suppress_email(email: str, reason: str = "unsubscribe"):
+    """Add an address to the suppression list (idempotent)."""
+    email = normalize_email(email)
+    await db.suppression.upsert(
+        where={"email": email},
+        data={
+            "create": {"email": email, "reason": reason},
+            "update": {}
+        }
+    )
+
+
+async def load_suppressed_emails() -> set[str]:
+    """
+    Load every suppressed address into a set.
+
+    Called once per campaign or preview so each recipient check is an O(1)
+    set lookup instead of a query.
+    """
+    rows = await db.query_raw('SELECT "email" FROM "Suppression"')
+    return {row["email"] for row in rows}
+
+
+def is_suppressed(user, suppressed: set[str]) -> bool:
+    """Check a recipient against a set from load_suppressed_emails()."""
+    return normalize_email(user.email) in suppressed
+
+
+# ===== Admin API =====
+
+class SuppressionRequest(BaseModel):
+    email: EmailStr
+    reason: str = "manual"
+
+
+@router.get("")
+async def list_suppressions(limit: int = 100, offset: int = 0):
+    """List suppressed addresses, newest first."""
+    total = await db.suppression.count()
+    rows = await db.suppression.find_many(
+        order={"createdAt": "desc"},
+        take=min(limit, 1000),
+        skip=offset
+    )
+    return {
+        "total": total,
+        "suppressions": [
+            {"email": r.email, "reason": r.reason, "createdAt": r.createdAt}
+            for r in rows
+        ]
+    }
+
+
+@router.post("")
+async def add_suppression(request: SuppressionRequest):
+    """Suppress an address by hand, e.g. after a bounce or complaint."""
+    if request.reason not in SUPPRESSION_REASONS:
+        raise HTTPException(status_code=400, detail=f"reason must be one of {', '.join(SUPPRESSION_REASONS)}")
+
+    await suppress_email(request.email, request.reason)
+    return {"message": "Suppressed", "email": normalize_email(request.email)}
+
+
+@router.delete("/{email}")
+async def remove_suppression(email: str):
+    """Allow campaigns to reach an address again."""
+    deleted = await db.suppression.delete_many(where={"email": normalize_email(email)})
+    if deleted == 0:
+        raise HTTPException(status_code=404, detail="Address is not suppressed")
+    return {"message": "Removed"}
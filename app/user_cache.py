@@ -0,0 +1,101 @@
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from datetime import datetime
+
+from app.metrics import user_cache_lookups
+
+
+class CachedUser(NamedTuple):
+    id: str
+    name: str | None
+    phone: str | None
+    tags: tuple[str, ...]
+    created_at: datetime
+
+
+def get_user_cache_size() -> int:
+    """Get the maximum number of users kept in the check-in cache."""
+    return int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+
+def get_user_cache_ttl() -> float:
+    """Get how long a cached user is trusted, bounding staleness across workers."""
+    return float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+
+class UserCache:
+    """
+    Bounded LRU of email -> CachedUser, kept in step with writes.
+
+    Check-ins and imports write through to it; any other user mutation must
+    call invalidate(). Entries expire after a TTL so changes made by other
+    worker processes are picked up eventually.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[float, CachedUser]] = OrderedDict()
+
+    def get(self, email: str) -> CachedUser | None:
+        entry = self.entries.get(email)
+        if entry is None:
+            user_cache_lookups.inc(("miss",))
+            return None
+
+        stored_at, user = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self.entries[email]
+            user_cache_lookups.inc(("expired",))
+            return None
+
+        self.entries.move_to_end(email)
+        user_cache_lookups.inc(("hit",))
+        return user
+
+    def put(self, email: str, user: CachedUser):
+        if self.max_size <= 0:
+            return
+        self.entries[email] = (time.monotonic(), user)
+        self.entries.move_to_end(email)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def merge(self, email: str, name: str | None, phone: str | None, tags: list[str]):
+        """
+        Apply an import upsert to an already cached entry, with the same
+        rules as the SQL (new name/phone win if given, tags are appended).
+        Uncached emails are not added, so a large import does not evict
+        the kiosk's hot entries.
+        """
+        entry = self.entries.get(email)
+        if entry is None:
+            return
+        user = entry[1]
+        self.put(email, user._replace(
+            name=name or user.name,
+            phone=phone or user.phone,
+            tags=user.tags + tuple(t for t in tags if t not in user.tags)
+        ))
+
+    def invalidate(self, email: str):
+        self.entries.pop(email, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+user_cache = UserCache(get_user_cache_size(), get_user_cache_ttl())
+
+
+def cache_user_row(row: dict):
+    """Write a user row returned by the check-in statement to the cache."""
+    user_cache.put(row["email"], CachedUser(
+        id=row["id"],
+        name=row["name"],
+        phone=row["phone"],
+        tags=tuple(row["tags"]),
+        created_at=row["createdAt"]
+    ))
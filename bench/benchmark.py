@@ -0,0 +1,376 @@
+"""
+Check-In CRM 壓力測試 / 基準測試
+
+Seeds a local PostgreSQL database with synthetic users, starts the app with
+the stub email transport, and measures latency percentiles and throughput
+for the hot paths. Results are written as JSON so runs can be compared:
+
+    python bench/benchmark.py --database-url postgresql://localhost/crm_bench --scale 10k
+    python bench/benchmark.py ... --compare bench/results/<previous>.json
+
+The target database is wiped before seeding, so it must be a dedicated
+benchmark database on localhost (use --allow-remote to override).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import http.client
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+TAG_POOL = [f"活動{i:02d}" for i in range(20)]
+SEED_BATCH = 5_000
+
+
+def parse_scale(value: str) -> int:
+    return SCALES[value] if value in SCALES else int(value)
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """Latency percentiles (ms) and throughput for one scenario."""
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+
+
+# ===== Seeding =====
+
+async def seed_database(users: int, checkins_per_user: float):
+    """Wipe the database and insert synthetic users, tags and check-ins."""
+    from app.db import db
+    from app.stats import reconcile_counters
+
+    await db.connect()
+    try:
+        for model in (db.emaillog, db.eventlog, db.emailoutbox, db.checkinreceipt,
+                      db.campaigndelivery, db.suppression, db.scheduledemail, db.counter, db.user):
+            await model.delete_many()
+
+        rng = random.Random(42)
+        now = datetime.now(timezone.utc)
+
+        for start in range(0, users, SEED_BATCH):
+            count = min(SEED_BATCH, users - start)
+            await db.user.create_many(data=[
+                {
+                    "email": f"user{start + i}@bench.example.com",
+                    "name": f"測試用戶{start + i}",
+                    "phone": f"09{rng.randrange(10**8):08d}",
+                    "tags": rng.sample(TAG_POOL, rng.randint(1, 3)),
+                    "createdAt": now - timedelta(seconds=users - start - i),
+                }
+                for i in range(count)
+            ])
+
+        user_ids = [u.id for u in await db.user.find_many()]
+        logs = [
+            {"eventName": rng.choice(TAG_POOL), "userId": user_id}
+            for user_id in user_ids
+            for _ in range(int(checkins_per_user + rng.random()))
+        ]
+        for start in range(0, len(logs), SEED_BATCH):
+            await db.eventlog.create_many(data=logs[start:start + SEED_BATCH])
+
+        await reconcile_counters()
+        print(f"[Bench] Seeded {users} users, {len(logs)} check-ins")
+    finally:
+        await db.disconnect()
+
+
+# ===== HTTP load =====
+
+class Client:
+    """Keep-alive HTTP client, one per load thread."""
+
+    def __init__(self, host: str, port: int):
+        self.conn = http.client.HTTPConnection(host, port, timeout=120)
+
+    def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, float, float]:
+        """Return (status, time to first byte, total time)."""
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+
+        start = time.perf_counter()
+        self.conn.request(method, path, body=payload, headers=headers)
+        response = self.conn.getresponse()
+        first_byte = time.perf_counter() - start
+        while response.read(65536):
+            pass
+        return response.status, first_byte, time.perf_counter() - start
+
+
+def run_load(host: str, port: int, requests: list[tuple[str, str, dict | None]], concurrency: int) -> dict:
+    """Issue requests across `concurrency` threads and summarize latencies."""
+    latencies: list[float] = []
+    errors = 0
+    chunks = [requests[i::concurrency] for i in range(concurrency)]
+
+    def worker(chunk):
+        client = Client(host, port)
+        local, failed = [], 0
+        for method, path, body in chunk:
+            try:
+                status, _, total = client.request(method, path, body)
+                if status >= 400:
+                    failed += 1
+                else:
+                    local.append(total)
+            except Exception:
+                failed += 1
+                client = Client(host, port)
+        return local, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for local, failed in pool.map(worker, chunks):
+            latencies.extend(local)
+            errors += failed
+    elapsed = time.perf_counter() - start
+
+    return summarize(latencies, elapsed, errors)
+
+
+def bench_check_in(host, port, users, args) -> dict:
+    rng = random.Random(7)
+    requests = []
+    for i in range(args.requests):
+        # Mix of returning contacts and brand new ones
+        if rng.random() < args.returning_ratio:
+            email = f"user{rng.randrange(users)}@bench.example.com"
+        else:
+            email = f"new{i}-{rng.randrange(10**9)}@bench.example.com"
+        requests.append(("POST", "/api/check-in", {"email": email, "name": "壓測", "send_email": False}))
+    return run_load(host, port, requests, args.concurrency)
+
+
+def bench_users(host, port, users, args) -> dict:
+    requests = [("GET", "/api/users?limit=200", None)] * args.requests
+    return run_load(host, port, requests, args.concurrency)
+
+
+def bench_preview(host, port, users, args) -> dict:
+    rng = random.Random(11)
+    requests = [
+        ("GET", "/api/scheduler/preview-recipients?" + urlencode({"tags": rng.choice(TAG_POOL)}), None)
+        for _ in range(args.requests)
+    ]
+    return run_load(host, port, requests, args.concurrency)
+
+
+def bench_export(host, port, users, args) -> dict:
+    """Full CSV exports, one at a time; also reports time to first byte."""
+    client = Client(host, port)
+    latencies, first_bytes = [], []
+    start = time.perf_counter()
+    for _ in range(args.export_runs):
+        status, first_byte, total = client.request("GET", "/api/export/csv")
+        if status < 400:
+            latencies.append(total)
+            first_bytes.append(first_byte)
+    result = summarize(latencies, time.perf_counter() - start)
+    if first_bytes:
+        result["ttfb_p50_ms"] = round(statistics.median(first_bytes) * 1000, 2)
+    result["rows"] = users
+    return result
+
+
+# ===== Campaign =====
+
+async def bench_campaign(tag: str | None) -> dict:
+    """Run execute_scheduled_email in-process against the stub transport."""
+    from app.db import db
+    from app.scheduler import execute_scheduled_email
+
+    await db.connect()
+    try:
+        task = await db.scheduledemail.create(data={
+            "name": "bench",
+            "subject": "壓測郵件",
+            "htmlContent": "<p>親愛的 {{name}}，您好！</p><p>{{email}} / {{tags}}</p>" * 20,
+            "targetTags": json.dumps([tag] if tag else [], ensure_ascii=False),
+            # Due now, so the worker can claim it
+            "scheduledAt": datetime.now(timezone.utc),
+        })
+
+        start = time.perf_counter()
+        await execute_scheduled_email(task.id)
+        elapsed = time.perf_counter() - start
+
+        task = await db.scheduledemail.find_unique(where={"id": task.id})
+        recipients = task.sentCount + max(task.failedCount, 0)
+        return {
+            "status": task.status,
+            "recipients": recipients,
+            "sent": task.sentCount,
+            "failed": task.failedCount,
+            "duration_s": round(elapsed, 3),
+            "recipients_per_s": round(recipients / elapsed, 2) if elapsed else None,
+        }
+    finally:
+        await db.disconnect()
+
+
+# ===== Server lifecycle =====
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/event")
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become ready within 60 seconds")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline_path: str):
+    """Print per-scenario changes against a previous result file."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\n[Bench] Compared with {baseline_path} ({baseline['meta'].get('revision')})")
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "recipients_per_s"):
+            if metric in result and before.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                print(f"  {name:10s} {metric:17s} {before[metric]:>10} -> {result[metric]:>10} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), required=not os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--allow-remote", action="store_true", help="allow a non-localhost database")
+    parser.add_argument("--scale", default="1k", help="users to seed: 1k, 10k, 100k or a number")
+    parser.add_argument("--checkins-per-user", type=float, default=1.5)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--returning-ratio", type=float, default=0.7)
+    parser.add_argument("--export-runs", type=int, default=3)
+    parser.add_argument("--campaign-tag", default=TAG_POOL[0], help="target tag ('' for all users)")
+    parser.add_argument("--email-latency-ms", type=float, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--scenarios", default="checkin,users,export,preview,campaign")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="previous result file to compare against")
+    args = parser.parse_args()
+
+    host = urlparse(args.database_url).hostname
+    if host not in ("localhost", "127.0.0.1", "::1") and not args.allow_remote:
+        parser.error(f"refusing to wipe non-local database host {host!r} (use --allow-remote)")
+
+    users = parse_scale(args.scale)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url,
+        "EMAIL_TRANSPORT": "stub",
+        "EMAIL_STUB_LATENCY_MS": str(args.email_latency_ms),
+        "OUTBOX_WORKER_ENABLED": "false",
+    })
+    os.environ.update(env)
+
+    if not args.skip_seed:
+        asyncio.run(seed_database(users, args.checkins_per_user))
+
+    results = {}
+    http_scenarios = {
+        "checkin": bench_check_in,
+        "users": bench_users,
+        "export": bench_export,
+        "preview": bench_preview,
+    }
+
+    if any(s in http_scenarios for s in scenarios):
+        server = start_server(env, args.port)
+        try:
+            for name in scenarios:
+                if name in http_scenarios:
+                    print(f"[Bench] Running {name}...")
+                    results[name] = http_scenarios[name]("127.0.0.1", args.port, users, args)
+                    print(f"[Bench] {name}: {results[name]}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    if "campaign" in scenarios:
+        print("[Bench] Running campaign...")
+        results["campaign"] = asyncio.run(bench_campaign(args.campaign_tag or None))
+        print(f"[Bench] campaign: {results['campaign']}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": users,
+            "args": {k: v for k, v in vars(args).items() if k != "database_url"},
+        },
+        "scenarios": results,
+    }
+
+    output = args.output or os.path.join(
+        ROOT, "bench", "results", f"{datetime.now():%Y%m%d_%H%M%S}_{report['meta']['revision'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[Bench] Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,101 @@
+import os
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 
 from app.db import connect_db, disconnect_db
+from app.gmail import (
+    warm_up_gmail,
+    get_send_executor,
+    shutdown_send_executor,
+    get_email_transport,
+)
+from app.analytics_routes import router as analytics_router
+from app.events import router as events_router
+from app.import_routes import router as import_router
+from app.metrics import MetricsMiddleware, render_metrics
 from app.routes import router as api_router
 from app.scheduler_routes import router as scheduler_router
-from app.scheduler import start_scheduler, shutdown_scheduler, restore_pending_tasks
+from app.suppression import (
+    router as suppression_router,
+    suppress_email,
+    verify_unsubscribe_token,
+    warn_unsubscribe_config,
+)
+from app.outbox import start_outbox_worker, stop_outbox_worker
+from app.scheduler import (
+    start_scheduler,
+    shutdown_scheduler,
+    restore_pending_tasks,
+    schedule_counter_reconciliation,
+    schedule_campaign_dispatch,
+)
+from app.stats import reconcile_counters
+from app.startup import startup_report
+
+
+async def start_scheduled_jobs():
+    warn_unsubscribe_config()
+    start_scheduler()
+    await restore_pending_tasks()
+    schedule_counter_reconciliation()
+    schedule_campaign_dispatch()
+
+
+async def start_outbox():
+    start_outbox_worker()
+
+
+async def warm_up_email():
+    if get_email_transport() == "gmail":
+        # Run on the send pool: the service is cached per thread, so a
+        # warm-up on any other thread would build one no send ever uses
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(get_send_executor(), warm_up_gmail)
+
+
+async def start_background_services():
+    """
+    Start everything the kiosk does not need to serve its first request.
+    Runs after the app is accepting traffic; a failing phase is recorded
+    and the rest still start.
+    """
+    for name, start in (
+        ("scheduler", start_scheduled_jobs),
+        ("outbox_worker", start_outbox),
+        ("reconcile_counters", reconcile_counters),
+        ("gmail_warm_up", warm_up_email),
+    ):
+        try:
+            async with startup_report.phase(name, critical=False):
+                await start()
+        except Exception as e:
+            print(f"[Startup] Background phase {name} failed: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events."""
-    await connect_db()
-    start_scheduler()
-    await restore_pending_tasks()
+    async with startup_report.phase("connect_db"):
+        await connect_db()
+    startup_report.ready = True
+    startup_report.background_task = asyncio.create_task(start_background_services())
     yield
+    startup_report.ready = False
+    if not startup_report.background_done:
+        startup_report.background_task.cancel()
+        try:
+            await startup_report.background_task
+        except asyncio.CancelledError:
+            pass
+    await stop_outbox_worker()
     shutdown_scheduler()
+    await asyncio.to_thread(shutdown_send_executor)
     await disconnect_db()
 
 
@@ -29,8 +106,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Per-route latency histograms (the SSE stream is long-lived, so skip it)
+app.add_middleware(MetricsMiddleware, exclude_paths=("/api/events", "/metrics"))
+
+# Mount static files (the directory is optional)
+if os.path.isdir("static"):
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
@@ -38,6 +119,10 @@ templates = Jinja2Templates(directory="templates")
 # Include API routes
 app.include_router(api_router, prefix="/api")
 app.include_router(scheduler_router, prefix="/api")
+app.include_router(events_router, prefix="/api")
+app.include_router(import_router, prefix="/api")
+app.include_router(suppression_router, prefix="/api")
+app.include_router(analytics_router, prefix="/api")
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -56,3 +141,40 @@ async def dashboard(request: Request):
 async def scheduler_page(request: Request):
     """Render the scheduler management page."""
     return templates.TemplateResponse("scheduler.html", {"request": request})
+
+
+@app.get("/unsubscribe", response_class=HTMLResponse)
+async def unsubscribe_page(request: Request, token: str = ""):
+    """Ask the recipient to confirm unsubscribing (link scanners only GET)."""
+    email = verify_unsubscribe_token(token)
+    return templates.TemplateResponse(
+        "unsubscribe.html",
+        {"request": request, "email": email, "token": token, "done": False},
+        status_code=200 if email else 400
+    )
+
+
+@app.post("/unsubscribe", response_class=HTMLResponse)
+async def unsubscribe(request: Request, token: str = ""):
+    """Unsubscribe from the confirmation form or a one-click List-Unsubscribe POST."""
+    email = verify_unsubscribe_token(token)
+    if email:
+        await suppress_email(email, "unsubscribe")
+    return templates.TemplateResponse(
+        "unsubscribe.html",
+        {"request": request, "email": email, "token": token, "done": True},
+        status_code=200 if email else 400
+    )
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness probe: 200 once the app can serve check-ins, with phase timings."""
+    report = startup_report.snapshot()
+    return JSONResponse(jsonable_encoder(report), status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Expose in-process metrics in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
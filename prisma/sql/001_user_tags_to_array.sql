@@ -0,0 +1,52 @@
+-- 將 User.tags 從 JSON 字串轉換為 text[]（保留既有資料）
+-- 必須在 `prisma db push` 之前執行，否則 db push 會直接丟棄舊欄位。
+-- 可重複執行：欄位已是陣列（或資料表尚未建立）時不做任何事；GIN 索引由 db push 建立。
+
+-- 舊版 parse_tags 容許任何內容，所以不能假設每列都是合法的 JSON 陣列：
+-- JSON 陣列取其元素（略過 null）、JSON 字串視為單一標籤、其他 JSON 值視為無標籤，
+-- 無法解析的 JSON 則以逗號分隔拆成標籤。
+CREATE OR REPLACE FUNCTION pg_temp.tags_to_array(raw TEXT) RETURNS TEXT[] AS $$
+DECLARE
+    parsed JSONB;
+BEGIN
+    IF raw IS NULL OR btrim(raw) IN ('', '[]') THEN
+        RETURN ARRAY[]::TEXT[];
+    END IF;
+
+    BEGIN
+        parsed := raw::JSONB;
+    EXCEPTION WHEN others THEN
+        RETURN ARRAY(
+            SELECT btrim(tag)
+            FROM unnest(string_to_array(raw, ',')) AS tag
+            WHERE btrim(tag) <> ''
+        );
+    END;
+
+    RETURN CASE jsonb_typeof(parsed)
+        WHEN 'array' THEN ARRAY(
+            SELECT tag
+            FROM jsonb_array_elements_text(parsed) AS tag
+            WHERE tag IS NOT NULL
+        )
+        WHEN 'string' THEN ARRAY[parsed #>> '{}']
+        ELSE ARRAY[]::TEXT[]
+    END;
+END
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'User'
+          AND column_name = 'tags'
+          AND data_type = 'text'
+    ) THEN
+        ALTER TABLE "User" ADD COLUMN "tags_array" TEXT[] DEFAULT ARRAY[]::TEXT[];
+        UPDATE "User" SET "tags_array" = pg_temp.tags_to_array("tags");
+        ALTER TABLE "User" DROP COLUMN "tags";
+        ALTER TABLE "User" RENAME COLUMN "tags_array" TO "tags";
+    END IF;
+END $$;
@@ -0,0 +1,4 @@
+-- 以不分大小寫的方式比對 email（打卡與匯入都以 lower("email") 尋找既有用戶）
+-- Prisma schema 無法表達運算式索引，所以在 `prisma db push` 之後建立；
+-- db push 不會讀取運算式索引，因此也不會刪除它。可重複執行。
+CREATE INDEX IF NOT EXISTS "User_email_lower_idx" ON "User" (lower("email"));
@@ -4,12 +4,35 @@
 echo "Installing dependencies..."
 pip install -r requirements.txt
 
-# Generate Prisma Client
+# Generate Prisma Client (start.sh then skips generating it again)
 echo "Generating Prisma Client..."
-prisma generate
+prisma generate && python -m app.schema_state mark-client
+
+# Run data migrations that db push cannot express (e.g. column type changes)
+echo "Running SQL migrations..."
+# A failed migration must stop here: db push --accept-data-loss would
+# otherwise change the column type anyway and drop the old data
+for f in prisma/sql/*.sql; do
+    prisma db execute --file "$f" --schema prisma/schema.prisma || {
+        echo "SQL migration $f failed, not pushing the schema"
+        exit 1
+    }
+done
 
 # Push database schema (creates tables if not exist)
 echo "Pushing database schema..."
-prisma db push --accept-data-loss
+if prisma db push --accept-data-loss --skip-generate; then
+    # Objects the Prisma schema cannot express (e.g. expression indexes);
+    # the schema is only marked current once they all exist
+    echo "Running post-push SQL migrations..."
+    post_push_ok=1
+    for f in prisma/sql/post-push/*.sql; do
+        prisma db execute --file "$f" --schema prisma/schema.prisma || {
+            echo "SQL migration $f failed"
+            post_push_ok=0
+        }
+    done
+    [ "$post_push_ok" = "1" ] && python -m app.schema_state mark-db
+fi
 
 echo "Build completed!"
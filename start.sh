@@ -1,12 +1,45 @@
 #!/bin/bash
 
-# Generate Prisma Client
-echo "Generating Prisma Client..."
-prisma generate
+# Generate Prisma Client, unless the installed one was generated from this schema
+if python -m app.schema_state client-current; then
+    echo "Prisma Client is up to date, skipping generate"
+else
+    echo "Generating Prisma Client..."
+    prisma generate && python -m app.schema_state mark-client
+fi
 
-# Push database schema (creates tables if not exist)
-echo "Pushing database schema..."
-prisma db push --accept-data-loss
+# Migrate and push only if the database is not already on this schema
+# (set FORCE_SCHEMA_PUSH=1 to push anyway)
+if [ "${FORCE_SCHEMA_PUSH:-0}" != "1" ] && python -m app.schema_state db-current; then
+    echo "Database schema is up to date, skipping migrations and push"
+else
+    # Run data migrations that db push cannot express (e.g. column type changes)
+    echo "Running SQL migrations..."
+    # A failed migration must stop here: db push --accept-data-loss would
+    # otherwise change the column type anyway and drop the old data
+    for f in prisma/sql/*.sql; do
+        prisma db execute --file "$f" --schema prisma/schema.prisma || {
+            echo "SQL migration $f failed, not pushing the schema"
+            exit 1
+        }
+    done
+
+    # Push database schema (creates tables if not exist)
+    echo "Pushing database schema..."
+    if prisma db push --accept-data-loss --skip-generate; then
+        # Objects the Prisma schema cannot express (e.g. expression indexes);
+        # the schema is only marked current once they all exist
+        echo "Running post-push SQL migrations..."
+        post_push_ok=1
+        for f in prisma/sql/post-push/*.sql; do
+            prisma db execute --file "$f" --schema prisma/schema.prisma || {
+                echo "SQL migration $f failed"
+                post_push_ok=0
+            }
+        done
+        [ "$post_push_ok" = "1" ] && python -m app.schema_state mark-db
+    fi
+fi
 
 # Start the application
 echo "Starting FastAPI application..."
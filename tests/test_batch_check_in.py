@@ -0,0 +1,56 @@
+"""
+Batch check-in against a real database.
+
+Needs the app dependencies and a DATABASE_URL pointing at a database with
+the current schema pushed; skipped otherwise.
+"""
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("prisma.models")
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from fastapi.testclient import TestClient
+
+from main import app
+from app.db import db
+
+
+async def find_checked_in(emails: list[str]) -> dict[str, int]:
+    users = await db.user.find_many(where={"email": {"in": emails}}, include={"logs": True})
+    return {user.email: len(user.logs) for user in users}
+
+
+async def delete_users(emails: list[str], keys: list[str]):
+    await db.checkinreceipt.delete_many(where={"key": {"in": keys}})
+    await db.eventlog.delete_many(where={"user": {"is": {"email": {"in": emails}}}})
+    await db.user.delete_many(where={"email": {"in": emails}})
+
+
+def test_malformed_item_does_not_drop_the_batch():
+    run = uuid.uuid4().hex[:12]
+    emails = [f"batch-{run}-{i}@example.com" for i in range(2)]
+    keys = [f"{run}-{i}" for i in range(3)]
+    items = [
+        {"idempotency_key": keys[0], "email": emails[0], "send_email": False},
+        {"idempotency_key": keys[1], "email": "not-an-email", "send_email": False},
+        {"idempotency_key": keys[2], "email": emails[1], "send_email": False},
+    ]
+
+    with TestClient(app) as client:
+        try:
+            response = client.post("/api/check-in/batch", json={"items": items})
+            assert response.status_code == 200
+
+            results = response.json()["results"]
+            assert [r["idempotency_key"] for r in results] == keys
+            assert [r["success"] for r in results] == [True, False, True]
+            assert [r["invalid"] for r in results] == [False, True, False]
+
+            assert client.portal.call(find_checked_in, emails) == {emails[0]: 1, emails[1]: 1}
+        finally:
+            client.portal.call(delete_users, emails, keys)